@@ -0,0 +1,201 @@
+import collections
+import hashlib
+import os
+import threading
+import time
+import typing
+import weakref
+
+import FileSystem
+
+__LOCKED_CACHES__ = weakref.WeakSet()  # type: weakref.WeakSet[LRUCache]
+
+
+def __after_fork__():
+	for cache in tuple(__LOCKED_CACHES__):
+		cache.__lock__ = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+	os.register_at_fork(after_in_child=__after_fork__)
+
+
+class LRUCache:
+	def __init__(self, max_entries: int = -1, max_bytes: int = -1, ttl: float = -1, measure: typing.Callable = len):
+		self.__entries__ = collections.OrderedDict()  # type: collections.OrderedDict[typing.Hashable, tuple[typing.Any, float, int]]
+		self.__lock__ = threading.Lock()
+		self.__max_entries__ = int(max_entries)
+		self.__max_bytes__ = int(max_bytes)
+		self.__ttl__ = float(ttl)
+		self.__measure__ = measure
+		self.__used__ = 0
+		__LOCKED_CACHES__.add(self)
+
+	def __len__(self):
+		return len(self.__entries__)
+
+	def __contains__(self, key) -> bool:
+		return self.get(key, self) is not self
+
+	def __evict__(self, key) -> None:
+		value, expires, size = self.__entries__.pop(key)
+		self.__used__ -= size
+
+	def get(self, key, default=None):
+		with self.__lock__:
+			if key not in self.__entries__:
+				return default
+
+			value, expires, size = self.__entries__[key]
+
+			if 0 <= expires <= time.time():
+				self.__evict__(key)
+				return default
+
+			self.__entries__.move_to_end(key)
+			return value
+
+	def set(self, key, value, ttl: float = None) -> bool:
+		ttl = self.__ttl__ if ttl is None else float(ttl)
+		size = self.__measure__(value)
+
+		if 0 <= self.__max_bytes__ < size:
+			return False
+
+		with self.__lock__:
+			if key in self.__entries__:
+				self.__evict__(key)
+
+			self.__entries__[key] = (value, time.time() + ttl if ttl >= 0 else -1, size)
+			self.__used__ += size
+
+			while (0 <= self.__max_entries__ < len(self.__entries__)) or (0 <= self.__max_bytes__ < self.__used__):
+				self.__evict__(next(iter(self.__entries__)))
+
+			return True
+
+	def delete(self, key) -> bool:
+		with self.__lock__:
+			if key in self.__entries__:
+				self.__evict__(key)
+				return True
+			else:
+				return False
+
+	def clear(self) -> None:
+		with self.__lock__:
+			self.__entries__.clear()
+			self.__used__ = 0
+
+	def size(self) -> int:
+		return self.__used__
+
+
+class DiskCache:
+	def __init__(self, directory: FileSystem.Directory, ttl: float = -1, dumps: typing.Callable[[typing.Any], bytes] = None, loads: typing.Callable[[bytes], typing.Any] = None):
+		self.__directory__ = directory
+		self.__ttl__ = float(ttl)
+		self.__dumps__ = dumps
+		self.__loads__ = loads
+
+	def __contains__(self, key) -> bool:
+		return self.get(key, self) is not self
+
+	@staticmethod
+	def __filename__(key) -> str:
+		return hashlib.sha1(str(key).encode()).hexdigest()
+
+	def get(self, key, default=None):
+		file = self.__directory__.file(self.__filename__(key))
+
+		try:
+			if not file.exists():
+				return default
+			elif 0 <= self.__ttl__ <= time.time() - file.modified():
+				file.delete()
+				return default
+
+			with file.open('rb') as f:
+				data = f.read()
+		except OSError:
+			return default
+
+		if self.__loads__ is None:
+			return data
+
+		try:
+			return self.__loads__(data)
+		except ValueError:
+			# Unreadable entries (e.g. written by an older format) count as misses
+			try:
+				file.delete()
+			except OSError:
+				pass
+
+			return default
+
+	def set(self, key, value) -> bool:
+		name = self.__filename__(key)
+		temp = self.__directory__.file(f'{name}.{os.getpid()}.{threading.get_ident()}.tmp')  # Forked workers share the directory and their thread idents
+		data = value if self.__dumps__ is None else self.__dumps__(value)
+
+		try:
+			self.__directory__.create()
+
+			with temp.open('wb') as f:
+				f.write(data)
+
+			os.replace(temp.filepath(), self.__directory__.file(name).filepath())
+			return True
+		except OSError:
+			temp.delete()
+			return False
+
+	def delete(self, key) -> bool:
+		return self.__directory__.delfile(self.__filename__(key))
+
+	def clear(self) -> None:
+		for file in self.__directory__.files():
+			file.delete()
+
+	def directory(self) -> FileSystem.Directory:
+		return self.__directory__
+
+
+class TieredCache:
+	def __init__(self, memory: LRUCache, disk: DiskCache):
+		self.__memory__ = memory
+		self.__disk__ = disk
+
+	def __contains__(self, key) -> bool:
+		return self.get(key, self) is not self
+
+	def get(self, key, default=None):
+		value = self.__memory__.get(key, self)
+
+		if value is self:
+			value = self.__disk__.get(key, self)
+
+			if value is self:
+				return default
+
+			self.__memory__.set(key, value)
+
+		return value
+
+	def set(self, key, value) -> bool:
+		self.__memory__.set(key, value)
+		return self.__disk__.set(key, value)
+
+	def delete(self, key) -> bool:
+		return self.__memory__.delete(key) | self.__disk__.delete(key)
+
+	def clear(self) -> None:
+		self.__memory__.clear()
+		self.__disk__.clear()
+
+	def memory(self) -> LRUCache:
+		return self.__memory__
+
+	def disk(self) -> DiskCache:
+		return self.__disk__
@@ -1,9 +1,30 @@
 import threading
 import multiprocessing
 import multiprocessing.connection
+import os
 import time
 import typing
-import psutil
+import weakref
+
+import Imports
+
+psutil = Imports.lazy('psutil')
+
+__FLIGHTS__ = weakref.WeakSet()  # type: weakref.WeakSet[SingleFlight]
+__LIMITERS__ = weakref.WeakSet()  # type: weakref.WeakSet[TokenBucket | Limiter | CircuitBreaker]
+
+
+def __after_fork__():
+	for flight in tuple(__FLIGHTS__):
+		flight.__lock__ = threading.Lock()
+		flight.__calls__ = {}
+
+	for limiter in tuple(__LIMITERS__):
+		limiter.__reset__()
+
+
+if hasattr(os, 'register_at_fork'):
+	os.register_at_fork(after_in_child=__after_fork__)
 
 
 class ThreadedFunction:
@@ -62,7 +83,7 @@ class ConcurrentFunction:
 		self.__pipe__ = None  # type: None | multiprocessing.connection.PipeConnection
 
 	@staticmethod
-	def __wrapper__(func: typing.Callable, pipe: multiprocessing.connection.PipeConnection, *args: tuple, **kwargs: dict):
+	def __wrapper__(func: typing.Callable, pipe: 'multiprocessing.connection.PipeConnection', *args: tuple, **kwargs: dict):
 		try:
 			pipe.send((True, func(*args, **kwargs)))
 		except (SystemExit, KeyboardInterrupt, Exception) as err:
@@ -124,7 +145,7 @@ class ParallelFunction:
 		self.__responded__ = []  # type: list[int]
 
 	@staticmethod
-	def __wrapper__(func: typing.Callable, pipe: multiprocessing.connection.PipeConnection, *args: tuple, **kwargs: dict):
+	def __wrapper__(func: typing.Callable, pipe: 'multiprocessing.connection.PipeConnection', *args: tuple, **kwargs: dict):
 		while not pipe.poll():
 			pass
 
@@ -224,3 +245,192 @@ class ParallelFunction:
 	def has_any_responded(self) -> bool:
 		self.update()
 		return any(self.__responded__)
+
+
+class SingleFlight:
+	def __init__(self):
+		self.__lock__ = threading.Lock()
+		self.__calls__ = {}  # type: dict[typing.Hashable, list]
+		__FLIGHTS__.add(self)
+
+	def run(self, key: typing.Hashable, func: typing.Callable, *args, **kwargs):
+		with self.__lock__:
+			call = self.__calls__.get(key)
+			leader = call is None
+
+			if leader:
+				call = self.__calls__[key] = [threading.Event(), None, None]  # Event, Response, Error
+
+		if leader:
+			try:
+				call[1] = func(*args, **kwargs)
+			except (SystemExit, KeyboardInterrupt, Exception) as err:
+				call[2] = err
+			finally:
+				with self.__lock__:
+					del self.__calls__[key]
+
+				call[0].set()
+		else:
+			call[0].wait()
+
+		if call[2] is not None:
+			raise call[2]
+		else:
+			return call[1]
+
+	def __contains__(self, key: typing.Hashable) -> bool:
+		return key in self.__calls__
+
+	def in_flight(self) -> int:
+		return len(self.__calls__)
+
+
+class TokenBucket:
+	def __init__(self, rate: float, capacity: float = None):
+		self.__rate__ = float(rate)
+		self.__capacity__ = max(1.0, self.__rate__) if capacity is None else float(capacity)
+		self.__tokens__ = self.__capacity__
+		self.__updated__ = time.monotonic()
+		self.__lock__ = threading.Lock()
+		__LIMITERS__.add(self)
+
+	def __reset__(self):
+		self.__lock__ = threading.Lock()
+
+	def __refill__(self, now: float):
+		self.__tokens__ = min(self.__capacity__, self.__tokens__ + (now - self.__updated__) * self.__rate__)
+		self.__updated__ = now
+
+	def acquire(self, tokens: float = 1, timeout: float = 0) -> bool:
+		if self.__rate__ < 0:
+			return True
+
+		deadline = time.monotonic() + max(0.0, float(timeout))
+
+		while True:
+			with self.__lock__:
+				now = time.monotonic()
+				self.__refill__(now)
+
+				if self.__tokens__ >= tokens:
+					self.__tokens__ -= tokens
+					return True
+
+				wait = (tokens - self.__tokens__) / self.__rate__ if self.__rate__ > 0 else float('inf')
+
+			if now + wait > deadline:
+				return False
+
+			time.sleep(wait)
+
+	def available(self) -> float:
+		with self.__lock__:
+			self.__refill__(time.monotonic())
+			return self.__tokens__
+
+
+class Limiter:
+	def __init__(self, max_in_flight: int = -1, bucket: TokenBucket = None, timeout: float = 0):
+		self.__max__ = int(max_in_flight)
+		self.__bucket__ = bucket
+		self.__timeout__ = float(timeout)
+		self.__reset__()
+		__LIMITERS__.add(self)
+
+	def __reset__(self):
+		# Threads do not survive a fork, so neither do their slots
+		self.__lock__ = threading.Lock()
+		self.__semaphore__ = threading.BoundedSemaphore(self.__max__) if self.__max__ >= 0 else None
+		self.__waiting__ = 0
+		self.__active__ = 0
+
+	def acquire(self, timeout: float = None) -> bool:
+		timeout = self.__timeout__ if timeout is None else max(0.0, float(timeout))
+		deadline = time.monotonic() + timeout
+
+		with self.__lock__:
+			self.__waiting__ += 1
+
+		try:
+			if self.__semaphore__ is not None and not self.__semaphore__.acquire(timeout=timeout):
+				return False
+			elif self.__bucket__ is not None and not self.__bucket__.acquire(1, max(0.0, deadline - time.monotonic())):
+				self.__semaphore__ is None or self.__semaphore__.release()
+				return False
+
+			with self.__lock__:
+				self.__active__ += 1
+
+			return True
+		finally:
+			with self.__lock__:
+				self.__waiting__ -= 1
+
+	def release(self):
+		with self.__lock__:
+			self.__active__ -= 1
+
+		self.__semaphore__ is None or self.__semaphore__.release()
+
+	def waiting(self) -> int:
+		return self.__waiting__
+
+	def in_flight(self) -> int:
+		return self.__active__
+
+
+class CircuitBreaker:
+	CLOSED, HALF_OPEN, OPEN = range(3)
+
+	def __init__(self, failures: int = 5, reset_timeout: float = 30):
+		self.__threshold__ = max(1, int(failures))
+		self.__reset_timeout__ = float(reset_timeout)
+		self.__state__ = self.CLOSED
+		self.__failures__ = 0
+		self.__opened__ = 0.0
+		self.__open_for__ = self.__reset_timeout__
+		self.__reset__()
+		__LIMITERS__.add(self)
+
+	def __reset__(self):
+		self.__lock__ = threading.Lock()
+		self.__probing__ = False
+
+	def allow(self) -> bool:
+		with self.__lock__:
+			if self.__state__ == self.CLOSED:
+				return True
+			elif self.__state__ == self.OPEN and time.monotonic() - self.__opened__ >= self.__open_for__:
+				self.__state__ = self.HALF_OPEN
+
+			# Half open lets exactly one probe through until it reports back
+			if self.__state__ == self.HALF_OPEN and not self.__probing__:
+				self.__probing__ = True
+				return True
+
+			return False
+
+	def success(self):
+		with self.__lock__:
+			self.__state__ = self.CLOSED
+			self.__failures__ = 0
+			self.__probing__ = False
+
+	def failure(self, retry_after: float | None = None):
+		# A retry_after hint from the remote side opens the breaker at once for exactly that long
+		with self.__lock__:
+			self.__failures__ += 1
+			self.__probing__ = False
+
+			if retry_after is not None or self.__state__ == self.HALF_OPEN or self.__failures__ >= self.__threshold__:
+				self.__state__ = self.OPEN
+				self.__opened__ = time.monotonic()
+				self.__open_for__ = self.__reset_timeout__ if retry_after is None else max(0.0, retry_after)
+
+	def cancel(self):
+		with self.__lock__:
+			self.__probing__ = False
+
+	def state(self) -> int:
+		return self.__state__
@@ -1,12 +1,33 @@
 # [=[ Connections.py for various socket based classes ]=]
 
-import asyncio
+import contextlib
+import itertools
 import threading
-import socketio
-import flask_socketio as fsocketio
-import flask
+import typing
+
+import Imports
+
+asyncio = Imports.lazy('asyncio')
+socketio = Imports.lazy('socketio')
+fsocketio = Imports.lazy('flask_socketio')
+flask = Imports.lazy('flask')
 
 PRIVATE_IDS = ('connect', 'disconnect', 'error', 'join', 'leave')
+BATCH_ID = '__batch__'  # Payload is a list of [event id, [args...]] pairs, unpacked by SocketioClient
+
+
+class SidSet(list):
+	'''
+	[SidSet]: Socket id collection passed as "skip_sid"\n
+	python-socketio requires a list here but tests membership once per recipient, so lookups are routed to a set
+	'''
+
+	def __init__(self, sids):
+		self.__sids__ = frozenset(sids)
+		super().__init__(self.__sids__)
+
+	def __contains__(self, sid) -> bool:
+		return sid in self.__sids__
 
 
 class FlaskSocketioServer:
@@ -15,6 +36,7 @@ class FlaskSocketioServer:
 	Attributes:\n
 	Methods:\n
 	\t"@WITH": Allows for with/as use (returns FlaskSocketioServer)
+	\t"prepare": Binds namespace handlers without starting a server (returns None)
 	\t"listen": Opens server at host:port (returns None)
 	\t"asyncListen": Opens server asyncronously (returns None)
 	\t"close": Closes server via exit(0); call this last (returns None)
@@ -22,11 +44,12 @@ class FlaskSocketioServer:
 	\t"of": Creates a new socketio namespace (returns FlaskSocketioNamespace)
 	\t"off": Remove callback from event id (returns None)
 	\t"emit": Send data to all sockets (returns None)
+	\t"emitToRoom": Send data to all sockets in a room across namespaces (returns None)
 	'''
 
-	def __init__(self, app):
+	def __init__(self, app, **kwargs):
 		self.__app = app
-		self.__socket = fsocketio.SocketIO(app)
+		self.__socket = fsocketio.SocketIO(app, **kwargs)
 		self.__spaces = [FlaskSocketioNamespace(self, '/')]
 		self.__state = False
 
@@ -36,11 +59,15 @@ class FlaskSocketioServer:
 	def __exit__(self, e1, e2, e3, tb):
 		self.close()
 
-	def listen(self, host: str='0.0.0.0', port: int=443):
+	def prepare(self):
 		for nspace in self.__spaces:
-			nspace.__prepare__(self.__socket)
+			if not nspace.ready:
+				nspace.__prepare__(self.__socket)
 
 		self.__state = True
+
+	def listen(self, host: str='0.0.0.0', port: int=443):
+		self.prepare()
 		self.__socket.run(self.__app, host, port)
 
 	def asyncListen(self, host: str='0.0.0.0', port: int=443):
@@ -71,6 +98,10 @@ class FlaskSocketioServer:
 		for nspace in self.__spaces:
 			nspace.emit(eid, *data, wl=wl, bl=bl)
 
+	def emitToRoom(self, room, eid, *data, bl=()):
+		for nspace in self.__spaces:
+			nspace.emitToRoom(room, eid, *data, bl=bl)
+
 
 class FlaskSocketioNamespace:
 	'''
@@ -81,6 +112,13 @@ class FlaskSocketioNamespace:
 	\t"on": Bind callback to event id (returns function)
 	\t"off": Remove callback from event id (returns None)
 	\t"emit": Send data to all sockets in namespace (returns None)
+	\t"join": Add a socket to a room (returns None)
+	\t"leave": Remove a socket from a room (returns None)
+	\t"emitToRoom": Send data to all sockets in a room (returns None)
+	\t"members": Sockets currently in a room (returns tuple[FlaskSocketioSocket])
+	\t"rooms": Names of all non-empty rooms (returns tuple[str])
+	\t"batch": Queue per-socket emits and send them as one frame per tick; None disables (returns None)
+	\t"flush": Send all queued per-socket emits now (returns None)
 	'''
 
 	def __init__(self, server: FlaskSocketioServer, namespace: str):
@@ -89,7 +127,16 @@ class FlaskSocketioNamespace:
 		self.__namespace__ = namespace
 		self.__events__ = {}
 		self.__sockets__ = {}
-		self.__socketEvents__ = {}
+		self.__handlers__ = {}  # type: dict[tuple[str, str], typing.Callable]
+		self.__registered__ = set()  # type: set[str]
+		self.__rooms__ = {}  # type: dict[str, set[str]]
+		self.__roomLock__ = threading.Lock()
+		self.__batching__ = None  # type: tuple[float, int, frozenset] | None
+		self.__flushing__ = False
+		self.__queues__ = {}  # type: dict[str, dict]
+		self.__sendLocks__ = {}  # type: dict[str, threading.Lock]
+		self.__sequence__ = itertools.count()
+		self.__batchLock__ = threading.Lock()
 
 	def __exec__(self, eid, *args, **kwargs):
 		if eid in self.__events__:
@@ -105,35 +152,153 @@ class FlaskSocketioNamespace:
 
 		@socket.on('disconnect', namespace=self.__namespace__)
 		def ondisconnect():
-			sid = flask.request.sid
-			if sid in self.__sockets__:
-				self.__sockets__[sid].__exec__('disconnect', self.__sockets__[sid].__is_disconnector__)
-				self.__sockets__[sid].connected = False
-				del self.__sockets__[sid]
+			self.__remove__(flask.request.sid)
 
 		self.__socket = socket
 		self.__ready = True
 
-	def __bindSocketEvent__(self, socket, eid):
-		if eid in self.__socketEvents__:
-			self.__socketEvents__[eid][socket.uid] = socket
-		else:
-			self.__socketEvents__[eid] = {socket.uid: socket}
+	def __remove__(self, sid):
+		if sid in self.__sockets__:
+			socket = self.__sockets__[sid]
+			socket.__exec__('disconnect', socket.__is_disconnector__)
+			socket.connected = False
+			self.__leaveAll__(socket)
+			self.__queues__.pop(sid, None)
+			self.__sendLocks__.pop(sid, None)
+
+			for eid in tuple(socket.__events__):
+				self.__handlers__.pop((eid, sid), None)
+
+			del self.__sockets__[sid]
+
+	def __dispatch__(self, eid, sid, *data):
+		handler = self.__handlers__.get((eid, sid))
+
+		if handler is not None:
+			handler(*data)
+
+	def __bindSocketEvent__(self, socket, eid, func):
+		if socket.uid not in self.__sockets__:
+			return
+
+		self.__handlers__[(eid, socket.uid)] = func
+
+		# socketio keeps one handler per event id for the whole namespace, so it is registered once and never removed
+		if eid not in self.__registered__:
+			self.__registered__.add(eid)
 
 			@self.__socket.on(eid, namespace=self.__namespace__)
 			def onevent(*data):
-				sid = flask.request.sid
-				if sid in self.__socketEvents__[eid]:
-					self.__socketEvents__[eid][sid].__exec__(eid, *data)
+				self.__dispatch__(eid, flask.request.sid, *data)
 
 	def __unbindSocketEvent__(self, socket, eid):
-		if eid in self.__socketEvents__ and socket in self.__socketEvents__[eid]:
-			self.__socketEvents__[eid].remove(socket)
-			if len(self.__socketEvents__[eid]) == 0:
-				del self.__socketEvents__[eid]
+		self.__handlers__.pop((eid, socket.uid), None)
 
 	def __emitToSocket__(self, socket, eid, data=()):
-		self.__socket.emit(eid, data, to=socket.uid, namespace=self.__namespace__)
+		batching = self.__batching__
+
+		if batching is None:
+			self.__socket.emit(eid, data, to=socket.uid, namespace=self.__namespace__)
+			return
+
+		interval, size, coalesce = batching
+
+		with self.__batchLock__:
+			queue = self.__queues__.setdefault(socket.uid, {})
+
+			# Coalesced events keep only their latest value, moved to the back so ordering follows the newest emit
+			if eid in coalesce:
+				queue.pop(eid, None)
+				queue[eid] = (eid, data)
+			else:
+				queue[next(self.__sequence__)] = (eid, data)
+
+			full = len(queue) >= size
+			start = not self.__flushing__
+			self.__flushing__ = True
+
+		if start:
+			self.__socket.start_background_task(self.__flusher__)
+
+		if full:
+			self.__flushSocket__(socket.uid)
+
+	def __flusher__(self):
+		while True:
+			batching = self.__batching__
+
+			if batching is None:
+				break
+
+			self.__socket.sleep(batching[0])
+			self.flush()
+
+		with self.__batchLock__:
+			self.__flushing__ = False
+
+		self.flush()
+
+	def __flushSocket__(self, sid):
+		with self.__batchLock__:
+			lock = self.__sendLocks__.setdefault(sid, threading.Lock())
+
+		# Taking the queue and sending it under the socket's own lock keeps a newer batch from overtaking an older one
+		with lock:
+			with self.__batchLock__:
+				queue = self.__queues__.pop(sid, None)
+
+			if queue and sid in self.__sockets__:
+				self.__send__(sid, tuple(queue.values()))
+
+	@contextlib.contextmanager
+	def __sending__(self, sids=None, skip=frozenset()):
+		# A broadcast must not overtake a batch already queued for, or being sent to, one of its recipients
+		# Their send locks are held (in sid order, so concurrent broadcasts cannot deadlock) while queues drain and the broadcast goes out
+		with self.__batchLock__:
+			pending = (self.__sendLocks__.keys() | self.__queues__.keys()) & self.__sockets__.keys()
+			pending = sorted((pending if sids is None else pending & sids) - skip)
+			locks = [self.__sendLocks__.setdefault(sid, threading.Lock()) for sid in pending]
+
+		with contextlib.ExitStack() as stack:
+			for lock in locks:
+				stack.enter_context(lock)
+
+			with self.__batchLock__:
+				queues = [(sid, self.__queues__.pop(sid, None)) for sid in pending]
+
+			for sid, queue in queues:
+				if queue and sid in self.__sockets__:
+					self.__send__(sid, tuple(queue.values()))
+
+			yield
+
+	def __send__(self, sid, messages):
+		if len(messages) == 1:
+			self.__socket.emit(messages[0][0], messages[0][1], to=sid, namespace=self.__namespace__)
+		else:
+			self.__socket.emit(BATCH_ID, [[eid, list(data)] for eid, data in messages], to=sid, namespace=self.__namespace__)
+
+	def __resolve__(self, socket):
+		sid = socket.uid if type(socket) is FlaskSocketioSocket else socket
+
+		if sid not in self.__sockets__:
+			raise KeyError(f"Socket '{sid}' is not connected to namespace '{self.__namespace__}'")
+
+		return self.__sockets__[sid]
+
+	def __leaveAll__(self, socket):
+		# socketio drops its own room entries on disconnect, only the local indexes need clearing
+		with self.__roomLock__:
+			for room in socket.__rooms__:
+				members = self.__rooms__.get(room)
+
+				if members is not None:
+					members.discard(socket.uid)
+
+					if len(members) == 0:
+						del self.__rooms__[room]
+
+			socket.__rooms__.clear()
 
 	def on(self, eid, func=None):
 		if func == None:
@@ -153,18 +318,81 @@ class FlaskSocketioNamespace:
 			del self.__events__[eid]
 
 	def emit(self, eid, *data, wl=(), bl=()):
-		wl = tuple([s.uid if type(s) is FlaskSocketioSocket else s for s in wl])
-		bl = tuple([s.uid if type(s) is FlaskSocketioSocket else s for s in bl])
+		# One emit per call: every sid is also a room, so whitelists go out as a room list and blacklists as skip_sid
+		wl = {s.uid if type(s) is FlaskSocketioSocket else s for s in wl}
+		bl = {s.uid if type(s) is FlaskSocketioSocket else s for s in bl}
 
 		if len(wl) > 0:
-			sockets = tuple([s for s in self.__sockets__ if s in wl])
+			sockets = self.__sockets__.keys() & wl
+
+			if len(sockets) > 0:
+				with self.__sending__(sockets):
+					self.__socket.emit(eid, data, to=list(sockets), namespace=self.__namespace__)
 		elif len(bl) > 0:
-			sockets = tuple([s for s in self.__sockets__ if s not in bl])
+			with self.__sending__(skip=bl):
+				self.__socket.emit(eid, data, namespace=self.__namespace__, skip_sid=SidSet(bl))
 		else:
-			sockets = self.__sockets__
+			with self.__sending__():
+				self.__socket.emit(eid, data, namespace=self.__namespace__)
+
+	def join(self, socket, room: str):
+		socket = self.__resolve__(socket)
+
+		with self.__roomLock__:
+			if room in socket.__rooms__:
+				return
+
+			self.__rooms__.setdefault(room, set()).add(socket.uid)
+			socket.__rooms__.add(room)
+
+		self.__socket.server.enter_room(socket.uid, room, namespace=self.__namespace__)
 
-		for sid in sockets:
-			self.__socket.emit(eid, data, to=sid, namespace=self.__namespace__)
+	def leave(self, socket, room: str):
+		socket = self.__resolve__(socket)
+
+		with self.__roomLock__:
+			if room not in socket.__rooms__:
+				return
+
+			socket.__rooms__.discard(room)
+			self.__rooms__[room].discard(socket.uid)
+
+			if len(self.__rooms__[room]) == 0:
+				del self.__rooms__[room]
+
+		self.__socket.server.leave_room(socket.uid, room, namespace=self.__namespace__)
+
+	def emitToRoom(self, room: str, eid, *data, bl=()):
+		bl = {s.uid if type(s) is FlaskSocketioSocket else s for s in bl}
+
+		with self.__roomLock__:
+			members = frozenset(self.__rooms__.get(room, ()))
+
+		if len(members) > 0:
+			with self.__sending__(members, bl):
+				self.__socket.emit(eid, data, to=room, namespace=self.__namespace__, skip_sid=SidSet(bl) if len(bl) > 0 else None)
+
+	def members(self, room: str) -> tuple:
+		return tuple([self.__sockets__[sid] for sid in tuple(self.__rooms__.get(room, ())) if sid in self.__sockets__])
+
+	def rooms(self) -> tuple:
+		return tuple(self.__rooms__)
+
+	def batch(self, interval: float | None = 0.05, size: int = 64, coalesce=()):
+		if interval is None:
+			self.__batching__ = None
+			self.flush()
+		elif interval <= 0 or size < 1:
+			raise ValueError('Batch interval and size must be positive')
+		else:
+			self.__batching__ = (interval, size, frozenset(coalesce))
+
+	def flush(self):
+		with self.__batchLock__:
+			sids = tuple(self.__queues__)
+
+		for sid in sids:
+			self.__flushSocket__(sid)
 
 	@property
 	def ready(self):
@@ -177,10 +405,13 @@ class FlaskSocketioSocket:
 	Attributes:\n
 	\t"auth": Authentication info provided on connection (\x01)
 	\t"uid": UID of socket (str)
+	\t"rooms": Rooms this socket has joined (tuple[str])
 	Methods:\n
 	\t"on": Bind callback to event id (returns function)
 	\t"off": Remove callback from event id (returns None)
 	\t"emit": Send data to all sockets (returns None)
+	\t"join": Join a room in this socket's namespace (returns None)
+	\t"leave": Leave a room in this socket's namespace (returns None)
 	\t"disconnect": Disconnects the socket (returns None)
 	'''
 
@@ -190,6 +421,7 @@ class FlaskSocketioSocket:
 		self.__is_disconnector__ = False
 		self.__uid = uid
 		self.__events__ = {}
+		self.__rooms__ = set()  # type: set[str]
 		self.auth = auth
 		self.connected = True
 		
@@ -202,7 +434,7 @@ class FlaskSocketioSocket:
 			self.__events__[eid] = func
 
 			if eid not in PRIVATE_IDS:
-				self.__space.__bindSocketEvent__(self, eid)
+				self.__space.__bindSocketEvent__(self, eid, func)
 		else:
 			raise TypeError(f"Cannot bind non-callable object '{func}'")
 
@@ -223,6 +455,12 @@ class FlaskSocketioSocket:
 
 	def emit(self, eid, *data):
 		self.__space.__emitToSocket__(self, eid, data)
+
+	def join(self, room: str):
+		self.__space.join(self, room)
+
+	def leave(self, room: str):
+		self.__space.leave(self, room)
 	
 	def disconnect(self):
 		self.__is_disconnector__ = True
@@ -233,6 +471,10 @@ class FlaskSocketioSocket:
 	def uid(self):
 		return self.__uid
 
+	@property
+	def rooms(self):
+		return tuple(self.__rooms__)
+
 
 class SocketioClient:
 	'''
@@ -276,6 +518,11 @@ class SocketioClient:
 		def error():
 			self.__exec__('error')
 
+		@self.__soc.on(BATCH_ID, namespace=self.__space)
+		def batch(messages):
+			for eid, args in messages:
+				self.__exec__(eid, *args)
+
 		self.__soc.connect(self.__host, namespaces=self.__space, wait=False, wait_timeout=3)
 
 	def __exec__(self, id_, *args, **kwargs):
@@ -42,6 +42,12 @@ class File:
 			open(self.__fpath__, 'x').close()
 			return True
 
+	def size(self) -> int:
+		return os.path.getsize(self.__fpath__)
+
+	def modified(self) -> float:
+		return os.path.getmtime(self.__fpath__)
+
 	def filepath(self) -> str:
 		return self.__fpath__
 
@@ -0,0 +1,76 @@
+import importlib
+import importlib.util
+import sys
+import threading
+import time
+import types
+
+__LOCK__ = threading.Lock()
+
+
+class LazyModule(types.ModuleType):
+	'''
+	[LazyModule]: Stand-in that imports the real module on first attribute access\n
+	Unlike importlib's LazyLoader the real module is only published once fully executed, so concurrent first accesses are safe
+	'''
+
+	def __getattr__(self, attr):
+		module = self.__dict__.get('__loaded__')
+
+		if module is None:
+			with __LOCK__:
+				module = importlib.import_module(self.__name__)
+				self.__dict__['__loaded__'] = module
+
+		return getattr(module, attr)
+
+
+def lazy(name: str):
+	if name in sys.modules:
+		return sys.modules[name]
+	elif importlib.util.find_spec(name) is None:
+		raise ModuleNotFoundError(f'No module named \'{name}\'', name=name)
+
+	return LazyModule(name)
+
+
+subprocess = lazy('subprocess')
+
+
+def profile(statement: str, cwd: str = None) -> tuple[float, list[tuple[str, int, float, float]]]:
+	'''
+	Runs statement in a fresh interpreter under -X importtime\n
+	Returns the wall time and one (module, depth, self seconds, cumulative seconds) row per imported module
+	'''
+
+	start = time.perf_counter()
+	process = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement], cwd=cwd, capture_output=True, text=True)
+	elapsed = time.perf_counter() - start
+	rows = []
+
+	if process.returncode != 0:
+		raise RuntimeError(f'Profiled statement failed:\n{process.stderr[-2000:]}')
+
+	for line in process.stderr.splitlines():
+		if not line.startswith('import time:') or line.endswith('imported package'):
+			continue
+
+		self_us, cumulative_us, name = line[len('import time:'):].split('|')
+		rows.append((name.strip(), (len(name) - len(name.lstrip()) - 1) // 2, int(self_us) / 1e6, int(cumulative_us) / 1e6))
+
+	return elapsed, rows
+
+
+def children(rows: list[tuple[str, int, float, float]], name: str) -> list[tuple[str, int, float, float]]:
+	# -X importtime lists a module's imports before the module itself, one level deeper
+	index = next(i for i, row in enumerate(rows) if row[0] == name)
+	depth = rows[index][1]
+	output = []
+
+	for row in reversed(rows[:index]):
+		if row[1] <= depth:
+			break
+		elif row[1] == depth + 1:
+			output.append(row)
+
+	return output
@@ -0,0 +1,201 @@
+import bisect
+import math
+import os
+import threading
+import typing
+import weakref
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (128, 512, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+MAX_LIVE_SHARDS = 64
+__METRICS__ = weakref.WeakSet()  # type: weakref.WeakSet[Metric]
+
+
+def __after_fork__():
+	for metric in tuple(__METRICS__):
+		metric.__reset__()
+
+
+if hasattr(os, 'register_at_fork'):
+	os.register_at_fork(after_in_child=__after_fork__)
+
+
+def escape(value) -> str:
+	return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_value(value: float) -> str:
+	if value == math.inf:
+		return '+Inf'
+	elif float(value).is_integer():
+		return str(int(value))
+	else:
+		return repr(float(value))
+
+
+class Metric:
+	TYPE = 'untyped'
+
+	def __init__(self, name: str, description: str, labels: tuple[str, ...] = ()):
+		self.__metric__ = str(name)
+		self.__help__ = str(description)
+		self.__labels__ = tuple(labels)
+		self.__reset__()
+		__METRICS__.add(self)
+
+	def __reset__(self):
+		# A forked worker counts only its own traffic, so whatever the parent recorded (including the forking thread's shard) is dropped along with a lock that may have been held
+		self.__local__ = threading.local()
+		self.__lock__ = threading.Lock()
+		self.__live__ = []  # type: list[tuple[threading.Thread, dict]]
+		self.__retired__ = {}  # type: dict[tuple, typing.Any]
+
+	def __shard__(self) -> dict:
+		# Every thread writes to its own shard so the hot path never takes a lock
+		try:
+			return self.__local__.shard
+		except AttributeError:
+			shard = self.__local__.shard = {}
+
+			with self.__lock__:
+				self.__live__.append((threading.current_thread(), shard))
+
+				if len(self.__live__) > MAX_LIVE_SHARDS:
+					self.__fold__()
+
+			return shard
+
+	def __fold__(self) -> None:
+		live = []
+
+		for thread, shard in self.__live__:
+			if thread.is_alive():
+				live.append((thread, shard))
+			else:
+				self.__merge__(self.__retired__, shard)
+
+		self.__live__ = live
+
+	def __merge__(self, into: dict, shard: dict) -> None:
+		for labels, value in tuple(shard.items()):
+			into[labels] = into.get(labels, 0) + value
+
+	def __series__(self, labels: tuple, suffix: str = '', extra: tuple[tuple[str, typing.Any], ...] = ()) -> str:
+		pairs = tuple(zip(self.__labels__, labels)) + extra
+		label_str = ','.join(f'{k}="{escape(v)}"' for k, v in pairs)
+		return f'{self.__metric__}{suffix}{{{label_str}}}' if len(pairs) > 0 else f'{self.__metric__}{suffix}'
+
+	def collect(self) -> dict[tuple, typing.Any]:
+		with self.__lock__:
+			self.__fold__()
+			total = {}
+			self.__merge__(total, self.__retired__)
+
+			for thread, shard in self.__live__:
+				self.__merge__(total, shard)
+
+			return total
+
+	def render(self) -> list[str]:
+		lines = [f'# HELP {self.__metric__} {self.__help__}', f'# TYPE {self.__metric__} {self.TYPE}']
+		lines.extend(f'{self.__series__(labels)} {format_value(value)}' for labels, value in sorted(self.collect().items()))
+		return lines
+
+	def name(self) -> str:
+		return self.__metric__
+
+
+class Counter(Metric):
+	TYPE = 'counter'
+
+	def inc(self, amount: float = 1, labels: tuple = ()) -> None:
+		shard = self.__shard__()
+		shard[labels] = shard.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+	TYPE = 'gauge'
+
+	def __init__(self, name: str, description: str, labels: tuple[str, ...] = (), function: typing.Callable[[], dict[tuple, float] | float] = None):
+		super().__init__(name, description, labels)
+		self.__function__ = function
+
+	def inc(self, amount: float = 1, labels: tuple = ()) -> None:
+		shard = self.__shard__()
+		shard[labels] = shard.get(labels, 0) + amount
+
+	def dec(self, amount: float = 1, labels: tuple = ()) -> None:
+		shard = self.__shard__()
+		shard[labels] = shard.get(labels, 0) - amount
+
+	def collect(self) -> dict[tuple, typing.Any]:
+		if self.__function__ is None:
+			return super().collect()
+
+		values = self.__function__()
+		return dict(values) if isinstance(values, dict) else {(): values}
+
+
+class Histogram(Metric):
+	TYPE = 'histogram'
+
+	def __init__(self, name: str, description: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = LATENCY_BUCKETS):
+		super().__init__(name, description, labels)
+		self.__buckets__ = tuple(sorted(buckets))
+
+	def __merge__(self, into: dict, shard: dict) -> None:
+		for labels, value in tuple(shard.items()):
+			if labels in into:
+				into[labels] = [a + b for a, b in zip(into[labels], value)]
+			else:
+				into[labels] = list(value)
+
+	def observe(self, value: float, labels: tuple = ()) -> None:
+		shard = self.__shard__()
+		series = shard.get(labels)
+
+		if series is None:
+			series = shard[labels] = [0] * (len(self.__buckets__) + 3)  # Bucket counts, +Inf, Sum, Count
+
+		series[bisect.bisect_left(self.__buckets__, value)] += 1
+		series[-2] += value
+		series[-1] += 1
+
+	def render(self) -> list[str]:
+		lines = [f'# HELP {self.__metric__} {self.__help__}', f'# TYPE {self.__metric__} {self.TYPE}']
+
+		for labels, series in sorted(self.collect().items()):
+			cumulative = 0
+
+			for bound, count in zip(self.__buckets__ + (math.inf, ), series):
+				cumulative += count
+				lines.append(f'{self.__series__(labels, "_bucket", (("le", format_value(bound)), ))} {cumulative}')
+
+			lines.append(f'{self.__series__(labels, "_sum")} {format_value(series[-2])}')
+			lines.append(f'{self.__series__(labels, "_count")} {series[-1]}')
+
+		return lines
+
+
+class Registry:
+	def __init__(self):
+		self.__metrics__ = {}  # type: dict[str, Metric]
+
+	def register(self, metric: Metric) -> Metric:
+		if metric.name() in self.__metrics__:
+			raise KeyError(f'Metric \'{metric.name()}\' already registered')
+
+		self.__metrics__[metric.name()] = metric
+		return metric
+
+	def counter(self, name: str, description: str, labels: tuple[str, ...] = ()) -> Counter:
+		return self.register(Counter(name, description, labels))
+
+	def gauge(self, name: str, description: str, labels: tuple[str, ...] = (), function: typing.Callable = None) -> Gauge:
+		return self.register(Gauge(name, description, labels, function))
+
+	def histogram(self, name: str, description: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+		return self.register(Histogram(name, description, labels, buckets))
+
+	def render(self) -> str:
+		return '\n'.join(line for metric in self.__metrics__.values() for line in metric.render()) + '\n'
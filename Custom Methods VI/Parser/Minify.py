@@ -0,0 +1,141 @@
+import re
+
+IDENTIFIER_PATTERN = re.compile(r'[\w$\\]')
+REGEX_PRECEDERS = set('(,=:[!&|?{};+-*%<>~^')
+CSS_TOKEN_PATTERN = re.compile(r'["\']|/\*')
+REGEX_KEYWORDS = {'return', 'typeof', 'instanceof', 'in', 'of', 'new', 'delete', 'void', 'throw', 'case', 'do', 'else', 'yield', 'await'}
+
+
+def __string_end__(text: str, start: int) -> int:
+	quote = text[start]
+	i = start + 1
+
+	while i < len(text) and text[i] != quote:
+		i += 2 if text[i] == '\\' else 1
+
+	return min(i + 1, len(text))
+
+
+def __regex_end__(text: str, start: int) -> int:
+	i = start + 1
+	in_class = False
+
+	while i < len(text) and (in_class or text[i] != '/') and text[i] != '\n':
+		if text[i] == '\\':
+			i += 1
+		elif text[i] == '[':
+			in_class = True
+		elif text[i] == ']':
+			in_class = False
+
+		i += 1
+
+	i += 1
+
+	while i < len(text) and IDENTIFIER_PATTERN.match(text[i]):
+		i += 1
+
+	return min(i, len(text))
+
+
+def __gap_end__(text: str, start: int) -> tuple[int, bool]:
+	# Whitespace and comments together form one gap; reports whether the gap held a line break
+	i = start
+	newline = False
+
+	while i < len(text):
+		if text[i].isspace():
+			newline = newline or text[i] == '\n'
+			i += 1
+		elif text.startswith('//', i):
+			end = text.find('\n', i)
+			i = len(text) if end < 0 else end
+		elif text.startswith('/*', i):
+			end = text.find('*/', i + 2)
+			end = len(text) if end < 0 else end + 2
+			newline = newline or '\n' in text[i:end]
+			i = end
+		else:
+			break
+
+	return i, newline
+
+
+def __needs_space__(before: str, after: str) -> bool:
+	if before == '' or after == '':
+		return False
+	elif IDENTIFIER_PATTERN.match(before) and IDENTIFIER_PATTERN.match(after):
+		return True
+	else:
+		return before in '+-' and after in '+-'
+
+
+def js(text: str) -> str:
+	# Conservative: drops comments and indentation but keeps line breaks, so automatic semicolon insertion is unaffected
+	output = []
+	last = ''
+	i = 0
+
+	while i < len(text):
+		char = text[i]
+
+		if char in '"\'`':
+			end = __string_end__(text, i)
+			output.append(text[i:end])
+			last = char
+			i = end
+		elif char.isspace() or text.startswith('//', i) or text.startswith('/*', i):
+			end, newline = __gap_end__(text, i)
+
+			if newline and last not in ('', '\n'):
+				output.append('\n')
+				last = '\n'
+			elif __needs_space__(last, text[end:end + 1]):
+				output.append(' ')
+
+			i = end
+		elif char == '/' and (last in REGEX_PRECEDERS or last in ('', '\n') or re.search(r'[\w$]*$', ''.join(output[-16:])).group() in REGEX_KEYWORDS):
+			end = __regex_end__(text, i)
+			output.append(text[i:end])
+			last = '/'
+			i = end
+		else:
+			output.append(char)
+			last = char
+			i += 1
+
+	return ''.join(output).strip()
+
+
+def __css_plain__(segment: str) -> str:
+	# Spaces only go around punctuation that can never start a descendant selector or a calc() operand
+	segment = re.sub(r'\s+', ' ', segment)
+	segment = re.sub(r' ?([{};,]) ?', r'\1', segment)
+	return re.sub(r': ', ':', segment).replace(';}', '}')
+
+
+def css(text: str) -> str:
+	# Strings and comments are found in one scan, so quotes inside comments and comment markers inside strings stay inert
+	output = []
+	plain = []
+	i = 0
+
+	while i < len(text):
+		match = CSS_TOKEN_PATTERN.search(text, i)
+		end = len(text) if match is None else match.start()
+		plain.append(text[i:end])
+
+		if match is None:
+			break
+		elif match.group() == '/*':
+			close = text.find('*/', end + 2)
+			plain.append(' ')
+			i = len(text) if close < 0 else close + 2
+		else:
+			output.append(__css_plain__(''.join(plain)))
+			plain = []
+			i = __string_end__(text, end)
+			output.append(text[end:i])
+
+	output.append(__css_plain__(''.join(plain)))
+	return ''.join(output).strip()
@@ -0,0 +1,198 @@
+import collections.abc
+import mmap
+import struct
+import typing
+
+MAGIC = b'PKD2'
+HEADER = struct.Struct('<4s16sqQIII')  # Magic, Version, Source mtime (ns), Source size, String count, String table offset, Root offset
+NULL, FALSE, TRUE, INT, FLOAT, STRING, LIST, MAP = range(8)
+
+
+def dump(obj, version: str = '', source: tuple[int, int] = (0, 0)) -> bytes:
+	strings = {}  # type: dict[str, int]
+	body = bytearray(HEADER.size)
+
+	def write(value) -> int:
+		if value is None:
+			offset = len(body)
+			body.append(NULL)
+		elif type(value) is bool:
+			offset = len(body)
+			body.append(TRUE if value else FALSE)
+		elif type(value) is int:
+			offset = len(body)
+			body.extend(struct.pack('<Bq', INT, value))
+		elif type(value) is float:
+			offset = len(body)
+			body.extend(struct.pack('<Bd', FLOAT, value))
+		elif type(value) is str:
+			offset = len(body)
+			body.extend(struct.pack('<BI', STRING, strings.setdefault(value, len(strings))))
+		elif type(value) in (list, tuple):
+			items = [write(x) for x in value]
+			offset = len(body)
+			body.extend(struct.pack(f'<BI{len(items)}I', LIST, len(items), *items))
+		elif type(value) is dict:
+			keys = [strings.setdefault(str(k), len(strings)) for k in value.keys()]
+			items = [write(x) for x in value.values()]
+			offset = len(body)
+			body.extend(struct.pack(f'<BI{len(keys)}I{len(items)}I', MAP, len(keys), *keys, *items))
+		else:
+			raise TypeError(f'Cannot pack object of type \'{type(value).__name__}\'')
+
+		return offset
+
+	root = write(obj)
+	table = len(body)
+	encoded = [s.encode() for s in strings]
+	position = 0
+
+	for string in encoded:
+		body.extend(struct.pack('<I', position))
+		position += len(string)
+
+	body.extend(struct.pack('<I', position))
+	body.extend(b''.join(encoded))
+	HEADER.pack_into(body, 0, MAGIC, version.encode()[:16], *source, len(strings), table, root)
+	return bytes(body)
+
+
+def materialize(obj):
+	if isinstance(obj, (PackedMap, PackedList)):
+		return obj.to_python()
+	else:
+		raise TypeError(f'Object of type \'{type(obj).__name__}\' is not packed')
+
+
+class PackedFile:
+	def __init__(self, buffer: bytes | mmap.mmap):
+		magic, version, mtime, size, count, table, root = HEADER.unpack_from(buffer, 0)
+
+		if magic != MAGIC:
+			raise ValueError('Not a packed snapshot')
+
+		self.__buffer__ = buffer
+		self.__version__ = version.rstrip(b'\x00').decode()
+		self.__source__ = (mtime, size)
+		self.__table__ = table
+		self.__text__ = table + 4 * (count + 1)
+		self.__strings__ = [None] * count  # type: list[str | None]
+		self.__root__ = root
+
+	@classmethod
+	def open(cls, path: str) -> 'PackedFile':
+		with open(path, 'rb') as f:
+			return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+	def string(self, sid: int) -> str:
+		string = self.__strings__[sid]
+
+		if string is None:
+			start, end = struct.unpack_from('<II', self.__buffer__, self.__table__ + 4 * sid)
+			string = self.__strings__[sid] = self.__buffer__[self.__text__ + start:self.__text__ + end].decode()
+
+		return string
+
+	def value(self, offset: int):
+		tag = self.__buffer__[offset]
+
+		if tag == NULL:
+			return None
+		elif tag == FALSE:
+			return False
+		elif tag == TRUE:
+			return True
+		elif tag == INT:
+			return struct.unpack_from('<q', self.__buffer__, offset + 1)[0]
+		elif tag == FLOAT:
+			return struct.unpack_from('<d', self.__buffer__, offset + 1)[0]
+		elif tag == STRING:
+			return self.string(struct.unpack_from('<I', self.__buffer__, offset + 1)[0])
+		elif tag == LIST:
+			return PackedList(self, offset)
+		elif tag == MAP:
+			return PackedMap(self, offset)
+		else:
+			raise ValueError(f'Corrupt packed value at offset {offset}')
+
+	def root(self):
+		return self.value(self.__root__)
+
+	def version(self) -> str:
+		return self.__version__
+
+	def source(self) -> tuple[int, int]:
+		return self.__source__
+
+	def buffer(self) -> bytes | mmap.mmap:
+		return self.__buffer__
+
+
+class PackedList(collections.abc.Sequence):
+	def __init__(self, file: PackedFile, offset: int):
+		self.__file__ = file
+		self.__offset__ = offset
+		self.__count__ = struct.unpack_from('<I', file.buffer(), offset + 1)[0]
+		self.__items__ = {}  # type: dict[int, typing.Any]
+
+	def __repr__(self):
+		return f'<PACKED_LIST with {self.__count__} elements>'
+
+	def __len__(self):
+		return self.__count__
+
+	def __getitem__(self, index: int | slice):
+		if type(index) is slice:
+			return [self[i] for i in range(*index.indices(self.__count__))]
+		elif index < 0:
+			index += self.__count__
+
+		if not 0 <= index < self.__count__:
+			raise IndexError('Packed list index out of range')
+		elif index not in self.__items__:
+			offset = struct.unpack_from('<I', self.__file__.buffer(), self.__offset__ + 5 + 4 * index)[0]
+			self.__items__[index] = self.__file__.value(offset)
+
+		return self.__items__[index]
+
+	def to_python(self) -> list:
+		return [x.to_python() if isinstance(x, (PackedMap, PackedList)) else x for x in self]
+
+
+class PackedMap(collections.abc.Mapping):
+	def __init__(self, file: PackedFile, offset: int):
+		self.__file__ = file
+		self.__offset__ = offset
+		self.__count__ = struct.unpack_from('<I', file.buffer(), offset + 1)[0]
+		self.__index__ = None  # type: dict[str, int] | None
+		self.__items__ = {}  # type: dict[str, typing.Any]
+
+	def __repr__(self):
+		return f'<PACKED_MAP with {self.__count__} elements>'
+
+	def __keys__(self) -> dict[str, int]:
+		if self.__index__ is None:
+			buffer = self.__file__.buffer()
+			keys = struct.unpack_from(f'<{self.__count__}I', buffer, self.__offset__ + 5)
+			offsets = struct.unpack_from(f'<{self.__count__}I', buffer, self.__offset__ + 5 + 4 * self.__count__)
+			self.__index__ = {self.__file__.string(k): v for k, v in zip(keys, offsets)}
+
+		return self.__index__
+
+	def __len__(self):
+		return self.__count__
+
+	def __iter__(self):
+		return iter(self.__keys__())
+
+	def __contains__(self, key) -> bool:
+		return key in self.__keys__()
+
+	def __getitem__(self, key: str):
+		if key not in self.__items__:
+			self.__items__[key] = self.__file__.value(self.__keys__()[key])
+
+		return self.__items__[key]
+
+	def to_python(self) -> dict:
+		return {k: v.to_python() if isinstance(v, (PackedMap, PackedList)) else v for k, v in self.items()}
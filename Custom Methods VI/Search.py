@@ -0,0 +1,161 @@
+import array
+import bisect
+import collections
+import heapq
+import itertools
+import math
+import re
+import sys
+import typing
+
+TOKEN_PATTERN = re.compile(r'[^\W_]+')
+
+
+def normalize(text: str) -> str:
+	return ' '.join(str(text).casefold().replace('_', ' ').split())
+
+
+def tokenize(text: str) -> list[str]:
+	return TOKEN_PATTERN.findall(str(text).casefold())
+
+
+class PrefixIndex:
+	def __init__(self, entries: typing.Iterable[tuple[typing.Iterable[str], typing.Any, int]] = (), scan_limit: int = 256, top_size: int = 64):
+		self.__payloads__ = []  # type: list[typing.Any]
+		self.__ranks__ = array.array('i')
+		self.__scan_limit__ = int(scan_limit)
+		self.__top_size__ = int(top_size)
+		self.__tops__ = {}  # type: dict[str, list[int]]
+		keys = []
+
+		for texts, payload, rank in entries:
+			index = len(self.__payloads__)
+			self.__payloads__.append(payload)
+			self.__ranks__.append(int(rank))
+
+			for text in set(normalize(x) for x in texts):
+				words = text.split(' ')
+				keys.extend((' '.join(words[i:]), i > 0, index) for i in range(len(words)))
+
+		keys.sort()
+		self.__keys__ = [k[0] for k in keys]  # type: list[str]
+		self.__inner__ = array.array('b', (k[1] for k in keys))
+		self.__refs__ = array.array('I', (k[2] for k in keys))
+		length = 1
+
+		# Any prefix matching more than scan_limit keys gets its ranking up front, so a search never ranks a truncated alphabetical slice
+		while True:
+			crowded = False
+
+			for prefix, group in itertools.groupby(range(len(self.__keys__)), key=lambda i: self.__keys__[i][:length]):
+				group = list(group)
+
+				if len(prefix) == length and len(group) > self.__scan_limit__:
+					self.__tops__[prefix] = self.__rank__(group)[:self.__top_size__]
+					crowded = True
+
+			if not crowded:
+				break
+
+			length += 1
+
+	def __len__(self):
+		return len(self.__payloads__)
+
+	def __rank__(self, indices: typing.Iterable[int]) -> list[int]:
+		matches = {}
+
+		for i in indices:
+			ref = self.__refs__[i]
+			score = (self.__inner__[i], self.__ranks__[ref], len(self.__keys__[i]), self.__keys__[i])
+
+			if ref not in matches or score < matches[ref]:
+				matches[ref] = score
+
+		return sorted(matches, key=matches.__getitem__)
+
+	def __range__(self, prefix: str) -> range:
+		start = end = bisect.bisect_left(self.__keys__, prefix)
+
+		while end < len(self.__keys__) and self.__keys__[end].startswith(prefix):
+			end += 1
+
+		return range(start, end)
+
+	def search(self, prefix: str, count: int = 10) -> list:
+		prefix = normalize(prefix)
+
+		if len(prefix) == 0 or count <= 0:
+			return []
+
+		refs = self.__tops__.get(prefix)
+
+		# A full top list cannot answer for more than it holds; only then is the whole crowded range ranked
+		if refs is None or (count > len(refs) and len(refs) == self.__top_size__):
+			refs = self.__rank__(self.__range__(prefix))
+
+		return [self.__payloads__[ref] for ref in refs[:count]]
+
+
+class InvertedIndex:
+	def __init__(self, documents: typing.Iterable[tuple[str, typing.Any]] = (), k1: float = 1.2, b: float = 0.75):
+		self.__terms__ = {}  # type: dict[str, int]
+		self.__payloads__ = []  # type: list[typing.Any]
+		self.__lengths__ = array.array('I')
+		self.__k1__ = float(k1)
+		self.__b__ = float(b)
+		postings = []  # type: list[list[tuple[int, int]]]
+
+		for text, payload in documents:
+			doc = len(self.__payloads__)
+			tokens = tokenize(text)
+			self.__payloads__.append(payload)
+			self.__lengths__.append(len(tokens))
+
+			for term, freq in collections.Counter(tokens).items():
+				tid = self.__terms__.setdefault(sys.intern(term), len(self.__terms__))
+
+				if tid == len(postings):
+					postings.append([])
+
+				postings[tid].append((doc, min(freq, 0xFFFF)))
+
+		self.__offsets__ = array.array('I', [0])
+		self.__docs__ = array.array('I')
+		self.__freqs__ = array.array('H')
+
+		for posting in postings:
+			self.__docs__.extend(p[0] for p in posting)
+			self.__freqs__.extend(p[1] for p in posting)
+			self.__offsets__.append(len(self.__docs__))
+
+		self.__average__ = sum(self.__lengths__) / len(self.__lengths__) if len(self.__lengths__) > 0 else 0
+
+	def __len__(self):
+		return len(self.__payloads__)
+
+	def terms(self) -> int:
+		return len(self.__terms__)
+
+	def search(self, query: str, offset: int = 0, count: int = 10) -> tuple[int, list[tuple[float, typing.Any]]]:
+		scores = collections.defaultdict(float)  # type: dict[int, float]
+		k1 = self.__k1__
+		b = self.__b__
+		total = len(self.__payloads__)
+
+		for term in set(tokenize(query)):
+			tid = self.__terms__.get(term)
+
+			if tid is None:
+				continue
+
+			start, end = self.__offsets__[tid], self.__offsets__[tid + 1]
+			idf = math.log(1 + (total - (end - start) + 0.5) / (end - start + 0.5))
+
+			for i in range(start, end):
+				doc = self.__docs__[i]
+				freq = self.__freqs__[i]
+				scores[doc] += idf * freq * (k1 + 1) / (freq + k1 * (1 - b + b * self.__lengths__[doc] / self.__average__))
+
+		ranked = heapq.nsmallest(max(0, offset) + max(0, count), scores.items(), key=lambda x: (-x[1], x[0]))
+		return len(scores), [(score, self.__payloads__[doc]) for doc, score in ranked[max(0, offset):]]
@@ -3,8 +3,10 @@ import os
 import threading
 import typing
 
-import dill
 import pickle
+import Imports
+
+dill = Imports.lazy('dill')
 
 
 class StreamError(IOError):
@@ -0,0 +1,79 @@
+import sys
+import time
+import random
+import argparse
+
+import flask
+
+import Connection
+
+
+def build(sockets: int, events: int) -> tuple[Connection.FlaskSocketioNamespace, list[Connection.FlaskSocketioSocket], list[str]]:
+	# Sockets are registered directly so the dispatch table is measured without any transport underneath
+	app = flask.Flask(__name__)
+	server = Connection.FlaskSocketioServer(app, async_mode='threading')
+	namespace = server.of('/bench')
+	server.prepare()
+	eids = [f'event_{i}' for i in range(events)]
+	connected = []
+
+	for i in range(sockets):
+		socket = Connection.FlaskSocketioSocket(server, namespace, f'sid_{i}', None)
+		namespace.__sockets__[socket.uid] = socket
+		connected.append(socket)
+
+		for eid in eids:
+			socket.on(eid, lambda *data: None)
+
+	return namespace, connected, eids
+
+
+def measure(sockets: int, events: int, calls: int) -> dict:
+	namespace, connected, eids = build(sockets, events)
+	targets = [(random.choice(eids), random.choice(connected).uid) for _ in range(calls)]
+	dispatch = namespace.__dispatch__
+
+	start = time.perf_counter()
+
+	for eid, sid in targets:
+		dispatch(eid, sid, None)
+
+	dispatch_ns = (time.perf_counter() - start) / calls * 1e9
+	rebinds = [(random.choice(connected), random.choice(eids)) for _ in range(min(calls, 10000))]
+	start = time.perf_counter()
+
+	for socket, eid in rebinds:
+		socket.off(eid)
+		socket.on(eid, lambda *data: None)
+
+	rebind_ns = (time.perf_counter() - start) / len(rebinds) * 1e9
+	start = time.perf_counter()
+
+	for socket in connected:
+		namespace.__remove__(socket.uid)
+
+	remove_us = (time.perf_counter() - start) / sockets * 1e6
+
+	if len(namespace.__handlers__) > 0:
+		raise RuntimeError(f'{len(namespace.__handlers__)} handlers left after every socket disconnected')
+
+	return {'dispatch_ns': dispatch_ns, 'rebind_ns': rebind_ns, 'remove_us': remove_us}
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Measure per-event dispatch, rebind and disconnect cost of FlaskSocketioNamespace as sockets and event types grow')
+	parser.add_argument('--sockets', type=int, nargs='+', default=[10, 100, 1000, 10000], help='Connected socket counts to test')
+	parser.add_argument('--events', type=int, nargs='+', default=[1, 10, 100], help='Bound event ids per socket to test')
+	parser.add_argument('--calls', type=int, default=200000, help='Dispatches timed per configuration')
+	ARGS = parser.parse_args()
+
+	print(f'\n{"sockets":>10}{"events":>10}{"dispatch ns":>16}{"rebind ns":>16}{"remove us":>16}')
+
+	for SOCKETS in ARGS.sockets:
+		for EVENTS in ARGS.events:
+			if SOCKETS * EVENTS > 2_000_000:
+				print(f'{SOCKETS:>10}{EVENTS:>10}{"skipped":>16}', file=sys.stderr)
+				continue
+
+			RESULT = measure(SOCKETS, EVENTS, ARGS.calls)
+			print(f'{SOCKETS:>10}{EVENTS:>10}{RESULT["dispatch_ns"]:>16.1f}{RESULT["rebind_ns"]:>16.1f}{RESULT["remove_us"]:>16.2f}')
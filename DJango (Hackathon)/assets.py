@@ -0,0 +1,75 @@
+import os
+import sys
+import json
+import gzip
+import hashlib
+import mimetypes
+
+sys.path.append('../Custom Methods VI')
+from Parser import Minify
+
+MINIFIERS = {'.css': Minify.css, '.js': Minify.js}
+COMPRESSIBLE = ('.css', '.js', '.svg', '.html', '.json', '.txt')
+
+
+class Asset:
+	'''
+	[Asset]: One minified, content addressed static file\n
+	Attributes:\n
+	\t"name": Path relative to the static folder, as passed to url_for (str)
+	\t"hashed": Same path with the content hash before the extension (str)
+	\t"body": Minified file contents (bytes)
+	\t"mimetype": Guessed content type (str)
+	'''
+
+	def __init__(self, name: str, body: bytes):
+		stem, extension = os.path.splitext(name)
+		self.name = name
+		self.body = body
+		self.hashed = f'{stem}.{hashlib.sha256(body).hexdigest()[:12]}{extension}'
+		self.mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+
+
+def build(directory: str) -> dict[str, Asset]:
+	assets = {}
+
+	for root, dirs, files in os.walk(directory):
+		for filename in files:
+			path = os.path.join(root, filename)
+			name = os.path.relpath(path, directory).replace(os.sep, '/')
+			extension = os.path.splitext(filename)[1].lower()
+
+			with open(path, 'rb') as f:
+				body = f.read()
+
+			if extension in MINIFIERS:
+				body = MINIFIERS[extension](body.decode()).encode()
+
+			assets[name] = Asset(name, body)
+
+	return assets
+
+
+def write(assets: dict[str, Asset], output: str) -> None:
+	for asset in assets.values():
+		path = os.path.join(output, *asset.hashed.split('/'))
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+
+		with open(path, 'wb') as f:
+			f.write(asset.body)
+
+		if asset.hashed.endswith(COMPRESSIBLE):
+			with open(f'{path}.gz', 'wb') as f:
+				f.write(gzip.compress(asset.body, 9, mtime=0))
+
+	with open(os.path.join(output, 'manifest.json'), 'w') as f:
+		json.dump({asset.name: asset.hashed for asset in assets.values()}, f, indent='\t')
+
+
+if __name__ == '__main__':
+	if len(sys.argv) != 3:
+		print('Usage: assets.py <static folder> <output folder>')
+	else:
+		ASSETS = build(sys.argv[1])
+		write(ASSETS, sys.argv[2])
+		print(f'\033[38;2;0;255;0mBuilt {len(ASSETS)} assets {sys.argv[1]} -> {sys.argv[2]}\033[0m')
@@ -0,0 +1,313 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+import http.server
+import urllib.parse
+import socket
+import zlib
+import re
+import struct
+
+import psutil
+
+SCENARIOS = ('index', 'questionnaire', 'get_disciplines', 'get_disciplines_304', 'get_select_disciplines', 'get_web_logo', 'get_logo', 'get_logo_304', 'get_sprite', 'search_suggest', 'search_questions', 'get_company_items', 'metrics', 'page_load')
+ASSET_PATTERN = re.compile(r'(?:href|src)="(/static/[^"]+)"')
+
+
+def stub_logo() -> bytes:
+	# 16x16 grey PNG so the stub returns a real image without any assets on disk
+	def chunk(kind: bytes, data: bytes) -> bytes:
+		return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+	rows = b''.join(b'\x00' + b'\x80\x80\x80' * 16 for _ in range(16))
+	return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', 16, 16, 8, 2, 0, 0, 0)) + chunk(b'IDAT', zlib.compress(rows)) + chunk(b'IEND', b'')
+
+
+class StubLogoHandler(http.server.BaseHTTPRequestHandler):
+	protocol_version = 'HTTP/1.1'
+	delay = 0
+	logo = stub_logo()
+
+	def do_GET(self):
+		time.sleep(self.delay)
+		self.send_response(200)
+		self.send_header('Content-Type', 'image/png')
+		self.send_header('Content-Length', str(len(self.logo)))
+		self.end_headers()
+		self.wfile.write(self.logo)
+
+	def log_message(self, *args):
+		pass
+
+
+def start_stub_server(delay: float) -> http.server.ThreadingHTTPServer:
+	StubLogoHandler.delay = delay
+	server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), StubLogoHandler)
+	threading.Thread(target=server.serve_forever, daemon=True).start()
+	return server
+
+
+def serve(port: int, logo_url: str, cache_dir: str):
+	import werkzeug.serving
+	import main
+	import Connection
+	import FileSystem
+
+	main.LOGO_SERVICE_URL = logo_url
+	main.LOGO_CACHE = main.create_logo_cache(cache_dir)
+	main.swap_snapshot(main.read_snapshot(FileSystem.File('data/disciplines.json')))
+	server = Connection.FlaskSocketioServer(main.app)
+	main.UPDATES = server.of('/updates')
+	main.UPDATES.on('connect', lambda socket: socket.emit('version', main.SNAPSHOT.version))
+	server.prepare()
+	werkzeug.serving.make_server('127.0.0.1', port, main.app, threaded=True).serve_forever()
+
+
+def free_port() -> int:
+	with socket.socket() as sock:
+		sock.bind(('127.0.0.1', 0))
+		return sock.getsockname()[1]
+
+
+def percentile(samples: list[float], pct: float) -> float:
+	return samples[min(len(samples) - 1, max(0, round(pct / 100 * len(samples) + 0.5) - 1))] if len(samples) > 0 else 0
+
+
+class Client:
+	def __init__(self, port: int):
+		self.port = port
+		self.conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+		self.etag = None
+
+	def request(self, method: str, path: str, body: dict | None = None, headers: dict = None, raw: bytes | None = None) -> tuple[int, bytes, http.client.HTTPResponse]:
+		try:
+			self.conn.request(method, path, raw if body is None else json.dumps(body), headers or {})
+			response = self.conn.getresponse()
+			return response.status, response.read(), response
+		except (OSError, http.client.HTTPException):
+			self.conn.close()
+			self.conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=30)
+			raise
+
+
+def socketio_handshake(client: Client, namespace: str) -> bool:
+	# Engine.IO v4 long polling as socket.io-client opens it, up to the namespace's first event; closed afterwards so sessions do not pile up
+	status, body, response = client.request('GET', f'/socket.io/?EIO=4&transport=polling&t={time.perf_counter_ns()}')
+
+	if status != 200 or not body.startswith(b'0'):
+		return False
+
+	path = f'/socket.io/?EIO=4&transport=polling&sid={json.loads(body[1:])["sid"]}'
+	packets = b''
+
+	if client.request('POST', path, headers={'Content-Type': 'text/plain;charset=UTF-8'}, raw=f'40{namespace},'.encode())[0] != 200:
+		return False
+
+	for attempt in range(3):
+		status, body, response = client.request('GET', path)
+
+		if status != 200:
+			return False
+
+		packets += body
+
+		if f'42{namespace},'.encode() in packets:
+			break
+	else:
+		return False
+
+	return client.request('POST', path, headers={'Content-Type': 'text/plain;charset=UTF-8'}, raw=b'1')[0] == 200
+
+
+def run_scenario(client: Client, name: str, data: dict) -> bool:
+	keys = list(data)
+	companies = [(k, c) for k in keys for c in data[k]['companies']]
+
+	if name == 'index':
+		return client.request('GET', '/')[0] == 200
+	elif name == 'questionnaire':
+		return client.request('GET', '/questionnaire')[0] == 200
+	elif name == 'get_disciplines':
+		return client.request('GET', '/get_disciplines', headers={'Accept-Encoding': 'gzip'})[0] == 200
+	elif name == 'get_disciplines_304':
+		if client.etag is None:
+			client.etag = client.request('GET', '/get_disciplines')[2].getheader('ETag')
+
+		return client.request('GET', '/get_disciplines', headers={'If-None-Match': client.etag})[0] == 304
+	elif name == 'get_select_disciplines':
+		return client.request('POST', '/get_select_disciplines', {'targets': keys})[0] == 200
+	elif name == 'get_web_logo':
+		discipline, company = companies[int(time.perf_counter_ns()) % len(companies)]
+		return client.request('POST', '/get_web_logo', {'discipline': discipline, 'company': company})[0] == 200
+	elif name == 'get_logo':
+		discipline, company = companies[int(time.perf_counter_ns()) % len(companies)]
+		return client.request('GET', f'/logo/{discipline}/{urllib.parse.quote(company)}')[0] == 200
+	elif name == 'get_logo_304':
+		discipline, company = companies[int(time.perf_counter_ns()) % len(companies)]
+		etag = client.request('GET', f'/logo/{discipline}/{urllib.parse.quote(company)}')[2].getheader('ETag')
+		return client.request('GET', f'/logo/{discipline}/{urllib.parse.quote(company)}', headers={'If-None-Match': etag})[0] == 304
+	elif name == 'get_sprite':
+		status, body, response = client.request('GET', f'/sprites/{keys[int(time.perf_counter_ns()) % len(keys)]}')
+		return status == 200 and client.request('GET', json.loads(body)['sprite'])[0] == 200
+	elif name == 'search_suggest':
+		return client.request('GET', '/search/suggest?q=comp&k=10')[0] == 200
+	elif name == 'search_questions':
+		return client.request('GET', '/search/questions?q=tell+me+about+a+time&per_page=10')[0] == 200
+	elif name == 'get_company_items':
+		discipline, company = next((k, c) for k, c in companies if len(data[k]['companies'][c]['questions']) > 0)
+		return client.request('GET', f'/disciplines/{discipline}/{company}/questions?limit=10')[0] == 200
+	elif name == 'metrics':
+		return client.request('GET', '/metrics')[0] == 200
+	elif name == 'page_load':
+		# Same requests, in the same order, that one questionnaire page load issues from questionnaire.js
+		status, body, response = client.request('GET', '/questionnaire', headers={'Accept-Encoding': 'gzip'})
+		ok = status == 200
+
+		for asset in ASSET_PATTERN.findall(re.sub(r'<!--.*?-->', '', body.decode(), flags=re.S)):
+			ok = client.request('GET', asset, headers={'Accept-Encoding': 'gzip'})[0] == 200 and ok
+
+		ok = socketio_handshake(client, '/updates') and ok
+		ok = client.request('GET', '/get_disciplines')[0] == 200 and ok
+		status, body, response = client.request('POST', '/get_select_disciplines', {'targets': keys})
+
+		for discipline, selected in (json.loads(body).items() if status == 200 else ()):
+			sprite_status, sprite_body, sprite_response = client.request('GET', f'/sprites/{discipline}')
+			sprite = json.loads(sprite_body) if sprite_status == 200 else {'companies': {}}
+			ok = sprite_status == 200 and client.request('GET', sprite['sprite'])[0] == 200 and ok
+
+			for company in selected['companies']:
+				if company not in sprite['companies']:
+					ok = client.request('GET', f'/logo/{discipline}/{urllib.parse.quote(company)}')[0] == 200 and ok
+
+		return status == 200 and ok
+	else:
+		raise KeyError(f'Unknown scenario \'{name}\'')
+
+
+def benchmark(port: int, server: psutil.Process, name: str, data: dict, concurrency: int, duration: float) -> dict:
+	latencies = []
+	errors = [0]
+	lock = threading.Lock()
+	deadline = time.perf_counter() + duration
+
+	def worker():
+		client = Client(port)
+		local = []
+		failed = 0
+
+		while time.perf_counter() < deadline:
+			start = time.perf_counter()
+
+			try:
+				failed += not run_scenario(client, name, data)
+			except (OSError, http.client.HTTPException, ValueError):
+				failed += 1
+
+			local.append(time.perf_counter() - start)
+
+		with lock:
+			latencies.extend(local)
+			errors[0] += failed
+
+	start = time.perf_counter()
+	threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+	[thread.start() for thread in threads]
+	[thread.join() for thread in threads]
+	elapsed = time.perf_counter() - start
+	latencies.sort()
+
+	return {
+		'requests': len(latencies),
+		'errors': errors[0],
+		'throughput': len(latencies) / elapsed,
+		'p50_ms': percentile(latencies, 50) * 1000,
+		'p95_ms': percentile(latencies, 95) * 1000,
+		'p99_ms': percentile(latencies, 99) * 1000,
+		'rss_mb': server.memory_info().rss / 1048576
+	}
+
+
+def compare(current: float, baseline: float, lower_is_better: bool, width: int) -> str:
+	if baseline == 0:
+		return f'{current:.2f}'.rjust(width)
+
+	delta = (current - baseline) / baseline * 100
+	better = delta < 0 if lower_is_better else delta > 0
+	cell = f'{current:.2f} ({delta:+.1f}%)'.rjust(width)
+	return f'\033[38;2;{"0;255;0" if better else "255;0;0"}m{cell}\033[0m' if abs(delta) >= 0.05 else cell
+
+
+def report(results: dict, baseline: dict):
+	print(f'\n{"scenario":<24}{"req/s":>20}{"p50 ms":>20}{"p95 ms":>20}{"p99 ms":>20}{"rss MB":>20}{"errors":>8}')
+
+	for name, result in results.items():
+		base = baseline.get(name, {})
+		columns = (('throughput', False), ('p50_ms', True), ('p95_ms', True), ('p99_ms', True), ('rss_mb', True))
+		print(f'{name:<24}' + ''.join(compare(result[key], base.get(key, 0), lower, 20) for key, lower in columns) + f'{result["errors"]:>8}')
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Drive every route of main.py against a local logo stub and report throughput, latency and RSS')
+	parser.add_argument('scenarios', nargs='*', default=SCENARIOS, help=f'Scenarios to run (default: all of {", ".join(SCENARIOS)})')
+	parser.add_argument('--concurrency', type=int, default=8, help='Concurrent client workers')
+	parser.add_argument('--duration', type=float, default=5, help='Seconds to run each scenario')
+	parser.add_argument('--logo-delay', type=float, default=0.05, help='Seconds the stub logo service waits before answering')
+	parser.add_argument('--save', default=None, help='Write the results to this JSON file')
+	parser.add_argument('--baseline', default=None, help='Compare against results saved with --save')
+	parser.add_argument('--serve', nargs=3, metavar=('PORT', 'LOGO_URL', 'CACHE_DIR'), help=argparse.SUPPRESS)
+	ARGS = parser.parse_args()
+
+	if ARGS.serve is not None:
+		serve(int(ARGS.serve[0]), ARGS.serve[1], ARGS.serve[2])
+		sys.exit(0)
+
+	os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+	with open('data/disciplines.json', 'r') as f:
+		DATA = json.load(f)
+
+	STUB = start_stub_server(ARGS.logo_delay)
+	PORT = free_port()
+	CACHE_DIR = tempfile.TemporaryDirectory()
+	SERVER = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', str(PORT), f'http://127.0.0.1:{STUB.server_address[1]}/', CACHE_DIR.name], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+	try:
+		for attempt in range(100):
+			try:
+				socket.create_connection(('127.0.0.1', PORT), 0.1).close()
+				break
+			except OSError:
+				time.sleep(0.1)
+		else:
+			raise RuntimeError('Server did not start')
+
+		SERVER_PROCESS = psutil.Process(SERVER.pid)
+		RESULTS = {}
+		print(f'\033[38;2;0;255;255mBenchmarking {len(ARGS.scenarios)} scenarios, {ARGS.concurrency} workers, {ARGS.duration}s each\033[0m')
+
+		for SCENARIO in ARGS.scenarios:
+			RESULTS[SCENARIO] = benchmark(PORT, SERVER_PROCESS, SCENARIO, DATA, ARGS.concurrency, ARGS.duration)
+			print(f'  {SCENARIO}: {RESULTS[SCENARIO]["throughput"]:.1f} req/s')
+
+		BASELINE = {}
+
+		if ARGS.baseline is not None:
+			with open(ARGS.baseline, 'r') as f:
+				BASELINE = json.load(f)['results']
+
+		report(RESULTS, BASELINE)
+
+		if ARGS.save is not None:
+			with open(ARGS.save, 'w') as f:
+				json.dump({'created': time.time(), 'concurrency': ARGS.concurrency, 'duration': ARGS.duration, 'logo_delay': ARGS.logo_delay, 'results': RESULTS}, f, indent='\t')
+	finally:
+		SERVER.terminate()
+		SERVER.wait()
+		STUB.shutdown()
+		CACHE_DIR.cleanup()
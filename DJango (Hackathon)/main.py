@@ -1,16 +1,303 @@
 import os
 import signal
 import json
-import requests
 import base64
 import sys
+import time
+import argparse
+import concurrent.futures
+import hashlib
+import threading
+import gzip
+import zlib
+import gc
+import socket
+import functools
+import typing
+import urllib.parse
+import email.utils
+import werkzeug.serving
 
 sys.path.append('../Custom Methods VI')
+import Cache
+import Concurrent
 import Connection
+import Imports
 
-from flask import Flask, send_file, request, render_template, redirect, Response
+from flask import Flask, send_file, request, render_template, redirect, Response, g
 
 import FileSystem
+import Metrics
+import Search
+import store
+import assets
+from Parser import Packed
+
+requests = Imports.lazy('requests')
+
+LOGO_SERVICE_URL = 'https://logo.clearbit.com/'
+HTTP_POOL_SIZE = 32
+HTTP_TIMEOUT = 10
+LOGO_CACHE_TTL = 7 * 24 * 60 * 60
+LOGO_STALE_TTL = 30 * 24 * 60 * 60
+LOGO_NEGATIVE_TTL = 10 * 60  # How long a 4xx from the logo service is trusted before asking again
+LOGO_CACHE_MAX_ENTRIES = 1024
+LOGO_CACHE_MAX_BYTES = 32 * 1024 * 1024
+LOGO_MAX_AGE = 24 * 60 * 60
+LOGO_CACHE = None  # type: Cache.TieredCache | None
+LOGO_FLIGHTS = Concurrent.SingleFlight()
+LOGO_UPSTREAM_RATE = 20
+LOGO_UPSTREAM_BURST = 40
+LOGO_UPSTREAM_CONCURRENCY = 8
+LOGO_UPSTREAM_WAIT = 0.5
+LOGO_LIMITER = Concurrent.Limiter(LOGO_UPSTREAM_CONCURRENCY, Concurrent.TokenBucket(LOGO_UPSTREAM_RATE, LOGO_UPSTREAM_BURST), LOGO_UPSTREAM_WAIT)
+LOGO_BREAKER_FAILURES = 5
+LOGO_BREAKER_RESET = 30
+LOGO_RETRY_AFTER_MAX = 300  # Longest Retry-After the logo service may impose before it is probed again
+LOGO_BREAKER = Concurrent.CircuitBreaker(LOGO_BREAKER_FAILURES, LOGO_BREAKER_RESET)
+LOGO_FALLBACK_SVG = b'<svg xmlns="http://www.w3.org/2000/svg" width="64" height="64" viewBox="0 0 64 64"><rect width="64" height="64" rx="8" fill="#cccccc"/></svg>'
+SPRITE_CELL = 64
+SPRITE_COLUMNS = 16
+SPRITE_WORKERS = 8
+SPRITE_RETRY = 30  # Seconds before a sheet missing logos is rebuilt even if none of them turned up in the cache
+SPRITE_FLIGHTS = Concurrent.SingleFlight()
+WARMUP_WORKERS = 8
+WARMUP_DEADLINE = 15
+RELOAD_INTERVAL = 2
+SUGGEST_LIMIT = 25
+QUESTIONS_PAGE_LIMIT = 50
+ITEMS_PAGE_LIMIT = 100
+SERVER_HOST = '0.0.0.0'
+SERVER_PORT = 8080
+PREFORK_BACKLOG = 1024
+DATABASE_CACHE_SIZE = 64
+STATIC_MAX_AGE = 365 * 24 * 60 * 60
+PROFILE_TOP = 20
+STATIC_ASSETS = {}  # type: dict[str, assets.Asset]
+STATIC_FILES = {}  # type: dict[str, PreparedResponse]
+SNAPSHOT = None  # type: DisciplinesSnapshot | None
+PUBLISHER = True  # Cleared in every worker but the first when a message queue already carries emits to all of them
+UPDATES = None  # type: Connection.FlaskSocketioNamespace | None
+METRICS = Metrics.Registry()
+REQUEST_LATENCY = METRICS.histogram('http_request_duration_seconds', 'Time spent handling a request until the response is returned', ('route', 'method', 'status'))
+REQUEST_SIZE = METRICS.histogram('http_response_size_bytes', 'Size of non-streamed response bodies', ('route', ), Metrics.SIZE_BUCKETS)
+REQUESTS_IN_FLIGHT = METRICS.gauge('http_requests_in_flight', 'Requests currently being handled', ('route', ))
+LOGO_UPSTREAM_LATENCY = METRICS.histogram('logo_upstream_duration_seconds', 'Time spent waiting on the logo service', ('status', ))
+LOGO_CACHE_LOOKUPS = METRICS.counter('logo_cache_lookups_total', 'Logo cache lookups by result', ('result', ))
+LOGO_UPSTREAM_REJECTIONS = METRICS.counter('logo_upstream_rejections_total', 'Logo fetches refused by the upstream limiter or circuit breaker, by what was served instead', ('reason', 'served'))
+LOGO_UPSTREAM_QUEUE = METRICS.gauge('logo_upstream_queue_depth', 'Logo fetches waiting for an upstream slot', function=lambda: LOGO_LIMITER.waiting())
+LOGO_UPSTREAM_ACTIVE = METRICS.gauge('logo_upstream_in_flight', 'Logo fetches currently holding an upstream slot', function=lambda: LOGO_LIMITER.in_flight())
+LOGO_BREAKER_STATE = METRICS.gauge('logo_upstream_breaker_state', 'Logo service circuit breaker state (0 closed, 1 half open, 2 open)', function=lambda: LOGO_BREAKER.state())
+LOGO_REFRESHES = METRICS.counter('logo_background_refreshes_total', 'Background refreshes started for stale logos')
+
+
+class PreparedResponse:
+	def __init__(self, body: bytes, mimetype: str = 'application/json', cache_control: str = 'no-cache'):
+		self.body = body
+		self.mimetype = mimetype
+		self.cache_control = cache_control
+		self.etag = hashlib.sha256(body).hexdigest()[:32]
+		self.encodings = {'gzip': gzip.compress(body, 9, mtime=0), 'deflate': zlib.compress(body, 9)}
+
+	def respond(self) -> Response:
+		encoding = next((e for e, b in self.encodings.items() if request.accept_encodings[e] and len(b) < len(self.body)), None)
+		etag = self.etag if encoding is None else f'{self.etag}-{encoding}'  # Strong validators must differ per content-coding
+
+		if request.if_none_match.contains_weak(etag):
+			response = Response(status=304)
+		else:
+			response = Response(self.body if encoding is None else self.encodings[encoding], 200, mimetype=self.mimetype)
+
+			if encoding is not None:
+				response.headers['Content-Encoding'] = encoding
+
+		response.set_etag(etag)
+		response.headers['Cache-Control'] = self.cache_control
+		response.headers['Vary'] = 'Accept-Encoding'
+		return response
+
+
+class LogoUnavailableError(RuntimeError):
+	def __init__(self, reason: str, message: str):
+		super().__init__(message)
+		self.reason = reason  # One of 'breaker', 'limit', 'error', 'throttled', 'server'
+
+
+class LogoRecord:
+	MAGIC = b'LOGO1\n'
+
+	def __init__(self, data: bytes, content_type: str, fetched: float, status: int = 200, cache_control: str | None = None):
+		self.data = data
+		self.content_type = content_type if content_type.startswith('image/') else 'application/octet-stream'
+		self.fetched = fetched
+		self.status = status
+		self.cache_control = cache_control if cache_control is not None else f'public, max-age={LOGO_MAX_AGE if status < 400 else LOGO_NEGATIVE_TTL}'
+
+	def __len__(self):
+		return len(self.data)
+
+	@functools.cached_property
+	def etag(self) -> str:
+		return hashlib.sha256(self.data).hexdigest()[:32]
+
+	@functools.cached_property
+	def encoded(self) -> bytes:
+		return base64.b64encode(self.data)
+
+	def fresh(self) -> bool:
+		return time.time() - self.fetched < (LOGO_CACHE_TTL if self.status < 400 else LOGO_NEGATIVE_TTL)
+
+	def dumps(self) -> bytes:
+		return self.MAGIC + json.dumps({'type': self.content_type, 'fetched': self.fetched, 'status': self.status}).encode() + b'\n' + self.data
+
+	@classmethod
+	def loads(cls, blob: bytes) -> 'LogoRecord':
+		if not blob.startswith(cls.MAGIC):
+			raise ValueError('Not a logo record')
+
+		header, data = blob[len(cls.MAGIC):].split(b'\n', 1)
+
+		try:
+			header = json.loads(header)
+			return cls(data, header['type'], float(header['fetched']), int(header.get('status', 200)))
+		except (KeyError, TypeError) as err:
+			raise ValueError(f'Corrupt logo record: {err}') from err
+
+	def respond(self) -> Response:
+		# The logo service has no logo for this company; the body it sent is not worth forwarding
+		if self.status >= 400:
+			response = Response('Logo not found', status=404)
+			response.headers['Cache-Control'] = self.cache_control
+			return response
+		elif request.if_none_match.contains_weak(self.etag):
+			response = Response(status=304)
+		elif not request.if_none_match and request.if_modified_since is not None and request.if_modified_since.timestamp() >= int(self.fetched):
+			response = Response(status=304)
+		else:
+			response = Response(self.data, 200, mimetype=self.content_type)
+
+		response.set_etag(self.etag)
+		response.last_modified = int(self.fetched)
+		response.headers['Cache-Control'] = self.cache_control
+		response.headers['X-Content-Type-Options'] = 'nosniff'
+		return response
+
+
+class DisciplineFragments(dict):
+	def __init__(self, disciplines: typing.Mapping[str, dict]):
+		super().__init__()
+		self.disciplines = disciplines
+
+	def __missing__(self, key: str) -> tuple[bytes, bytes]:
+		encoder = json.encoder.JSONEncoder(default=Packed.materialize)
+		name = encoder.encode(key)
+		fragment = encoder.encode(self.disciplines[key])
+		return self.setdefault(key, (f'{name}: {fragment}'.encode(), f'{name}: {encoder.encode(fragment)}'.encode()))  # Spliceable, Legacy double encoded
+
+
+class DisciplineSprites(dict):
+	def __init__(self, snapshot: 'DisciplinesSnapshot'):
+		super().__init__()
+		self.snapshot = snapshot
+
+	def __missing__(self, key: str) -> tuple[PreparedResponse, PreparedResponse, tuple[str, ...], float]:
+		sprite = SPRITE_FLIGHTS.run((self.snapshot.version, key), build_logo_sprite, self.snapshot, key)
+		return self.setdefault(key, sprite)  # Coordinate map, Sprite sheet, Urls that failed transiently, Build time
+
+	def __getitem__(self, key: str) -> tuple[PreparedResponse, PreparedResponse, tuple[str, ...], float]:
+		sprite = super().__getitem__(key)
+		missing, built = sprite[2], sprite[3]
+
+		# Incomplete sheets are rebuilt once a missing logo has been cached by /logo or a refresh, or after SPRITE_RETRY
+		if len(missing) > 0 and (time.time() - built >= SPRITE_RETRY or any(url in LOGO_CACHE for url in missing)):
+			sprite = SPRITE_FLIGHTS.run((self.snapshot.version, key), build_logo_sprite, self.snapshot, key)
+			self[key] = sprite
+
+		return sprite
+
+
+class DisciplinesSnapshot:
+	def __init__(self, disciplines: typing.Mapping[str, dict], version: str):
+		self.disciplines = disciplines
+		self.version = version
+
+	@functools.cached_property
+	def response(self) -> 'PreparedResponse':
+		return build_disciplines_response(self.disciplines)
+
+	@functools.cached_property
+	def fragments(self) -> DisciplineFragments:
+		return DisciplineFragments(self.disciplines)
+
+	@functools.cached_property
+	def sprites(self) -> DisciplineSprites:
+		return DisciplineSprites(self)
+
+	@functools.cached_property
+	def suggestions(self) -> Search.PrefixIndex:
+		return build_suggestion_index(self.disciplines)
+
+	@functools.cached_property
+	def questions(self) -> Search.InvertedIndex:
+		return build_question_index(self.disciplines)
+
+	def prepare(self) -> 'DisciplinesSnapshot':
+		for key in self.disciplines:
+			self.fragments[key]
+
+		self.response, self.suggestions, self.questions
+		return self
+
+	def company(self, discipline: str, company: str) -> dict | None:
+		if isinstance(self.disciplines, store.SqliteDisciplines):
+			return self.disciplines.company(discipline, company)
+		else:
+			return self.disciplines[discipline]['companies'].get(company) if discipline in self.disciplines else None
+
+	def company_url(self, discipline: str, company: str) -> str | None:
+		if isinstance(self.disciplines, store.SqliteDisciplines):
+			return self.disciplines.company_url(discipline, company)
+		else:
+			company = self.company(discipline, company)
+			return None if company is None else company['url']
+
+
+class DisciplinesWatcher:
+	def __init__(self, file: FileSystem.File, loader: typing.Callable[[FileSystem.File], DisciplinesSnapshot], interval: float = RELOAD_INTERVAL):
+		self.file = file
+		self.loader = loader
+		self.interval = interval
+		self.signature = self.stat()
+		self.__stopped = threading.Event()
+		self.__thread = threading.Thread(target=self.__poll, name='disciplines_watcher', daemon=True)
+
+	def __poll(self):
+		while not self.__stopped.wait(self.interval):
+			signature = self.stat()
+
+			if signature is None or signature == self.signature:
+				continue
+
+			self.signature = signature
+
+			try:
+				previous = swap_snapshot(self.loader(self.file))
+				print(f'\n\033[38;2;0;255;255mReloaded {self.file.basename()} [{previous.version} -> {SNAPSHOT.version}]\033[0m')
+				publish_update(previous, SNAPSHOT)
+			except Exception as err:  # Anything escaping here would end the watcher thread for good
+				print(f'\n\033[38;2;255;0;0mFailed to reload {self.file.basename()}, keeping {SNAPSHOT.version}: {err}\033[0m')
+
+	def stat(self) -> tuple[float, int] | None:
+		try:
+			return self.file.modified(), self.file.size()
+		except OSError:
+			return None
+
+	def start(self):
+		self.__thread.start()
+
+	def stop(self):
+		self.__stopped.set()
 
 
 def onkill(sig, frame):
@@ -18,20 +305,456 @@ def onkill(sig, frame):
 	os.kill(os.getpid(), signal.SIGTERM)
 
 
-def open_read_json_file(file: FileSystem.File) -> dict:
-	with file.open('r') as f:
-		decoder = json.JSONDecoder()
-		return decoder.decode(f.read())
+def read_snapshot(file: FileSystem.File) -> DisciplinesSnapshot:
+	with file.open('rb') as f:
+		data = f.read()
+
+	return DisciplinesSnapshot(json.JSONDecoder().decode(data.decode()), hashlib.sha256(data).hexdigest()[:16]).prepare()
+
+
+def read_database_snapshot(file: FileSystem.File) -> DisciplinesSnapshot:
+	disciplines = store.SqliteDisciplines(file.filepath(), DATABASE_CACHE_SIZE)
+	return DisciplinesSnapshot(disciplines, disciplines.version).prepare()
+
+
+def read_packed_snapshot(file: FileSystem.File) -> DisciplinesSnapshot:
+	# The packed file sits next to the json source and records its mtime and size, so any change to the source (including a restored older copy) rebuilds it
+	packed = FileSystem.File(f'{file.filepath().rsplit(".", 1)[0]}.bin')
+	stat = os.stat(file.filepath())
+	source = (stat.st_mtime_ns, stat.st_size)
+
+	try:
+		data = Packed.PackedFile.open(packed.filepath()) if packed.exists() else None
+	except ValueError:
+		data = None
+
+	if data is None or data.source() != source:
+		with file.open('rb') as f:
+			raw = f.read()
+
+		temp = f'{packed.filepath()}.{os.getpid()}.tmp'
+
+		with open(temp, 'wb') as f:
+			f.write(Packed.dump(json.JSONDecoder().decode(raw.decode()), hashlib.sha256(raw).hexdigest()[:16], source))
+
+		os.replace(temp, packed.filepath())
+		data = Packed.PackedFile.open(packed.filepath())
+
+	return DisciplinesSnapshot(data.root(), data.version()).prepare()
+
+
+def swap_snapshot(snapshot: DisciplinesSnapshot) -> DisciplinesSnapshot | None:
+	global SNAPSHOT
+	previous, SNAPSHOT = SNAPSHOT, snapshot
+	return previous
+
+
+def diff_data(previous, current, path: list, depth: int, encoder: json.encoder.JSONEncoder) -> list[dict]:
+	if depth <= 0 or not isinstance(previous, typing.Mapping) or not isinstance(current, typing.Mapping):
+		old, new = encoder.encode(previous), encoder.encode(current)
+		return [] if old == new else [{'op': 'set', 'path': path, 'value': json.loads(new)}]
+
+	ops = [{'op': 'remove', 'path': path + [key]} for key in previous if key not in current]
+
+	for key in current:
+		if key in previous:
+			ops.extend(diff_data(previous[key], current[key], path + [key], depth - 1, encoder))
+		else:
+			ops.append({'op': 'set', 'path': path + [key], 'value': json.loads(encoder.encode(current[key]))})
+
+	return ops
+
+
+def diff_snapshots(previous: DisciplinesSnapshot, current: DisciplinesSnapshot) -> list[dict]:
+	# Unchanged disciplines are skipped on their cached fragments, changed ones are diffed down to single companies
+	encoder = json.encoder.JSONEncoder(default=Packed.materialize)
+	ops = [{'op': 'remove', 'path': [key]} for key in previous.disciplines if key not in current.disciplines]
+
+	for key in current.disciplines:
+		if key not in previous.disciplines:
+			ops.append({'op': 'set', 'path': [key], 'value': json.loads(encoder.encode(current.disciplines[key]))})
+		elif previous.fragments[key][0] != current.fragments[key][0]:
+			ops.extend(diff_data(previous.disciplines[key], current.disciplines[key], [key], 2, encoder))
+
+	return ops
+
+
+def publish_update(previous: DisciplinesSnapshot | None, current: DisciplinesSnapshot):
+	if UPDATES is None or not PUBLISHER or previous is None or previous.version == current.version:
+		return
+
+	ops = diff_snapshots(previous, current)
+	UPDATES.emit('patch', {'from': previous.version, 'to': current.version, 'ops': ops})
+	print(f'\033[38;2;0;255;255mPublished {len(ops)} changes [{previous.version} -> {current.version}]\033[0m')
+
+
+def display_name(key: str) -> str:
+	return ' '.join(d.capitalize() for d in key.replace('_', ' ').split(' '))
+
+
+def build_disciplines_response(disciplines: dict) -> PreparedResponse:
+	keys = list(disciplines.keys())
+	names = [display_name(x) for x in keys]
+	return PreparedResponse(json.encoder.JSONEncoder().encode({'keys': keys, 'names': names}).encode())
+
+
+def build_suggestion_index(disciplines: typing.Mapping[str, dict]) -> Search.PrefixIndex:
+	companies = {key: [] for key in disciplines}  # type: dict[str, list[str]]
+	entries = []
+
+	if isinstance(disciplines, store.SqliteDisciplines):
+		for key, company in disciplines.company_names():
+			companies[key].append(company)
+	else:
+		for key, discipline in disciplines.items():
+			companies[key].extend(discipline['companies'])
+
+	for key, names in companies.items():
+		entries.append(((key, display_name(key)), {'type': 'discipline', 'discipline': key, 'name': display_name(key)}, 0))
+		entries.extend(((company, ), {'type': 'company', 'discipline': key, 'company': company, 'name': display_name(company)}, 1) for company in names)
+
+	return Search.PrefixIndex(entries)
+
+
+def build_question_index(disciplines: typing.Mapping[str, dict]) -> Search.InvertedIndex:
+	if isinstance(disciplines, store.SqliteDisciplines):
+		return Search.InvertedIndex((question, (key, company, i)) for key, company, i, question in disciplines.questions())
+
+	documents = []
+
+	for key, discipline in disciplines.items():
+		for company, data in discipline['companies'].items():
+			documents.extend((question, (key, company, i)) for i, question in enumerate(data['questions']))
+
+	return Search.InvertedIndex(documents)
+
+
+def encode_cursor(version: str, offset: int) -> str:
+	return base64.urlsafe_b64encode(f'{version}:{offset}'.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple[str, int]:
+	version, offset = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode().split(':')
+	return version, int(offset)
+
+
+def stream_items(items: list, start: int, end: int, cursor: str | None):
+	encoder = json.encoder.JSONEncoder(default=Packed.materialize)
+	yield f'{{"count": {end - start}, "items": ['
+
+	for i in range(start, end):
+		yield encoder.encode(items[i]) if i == start else ', ' + encoder.encode(items[i])
+
+	yield f'], "next": {encoder.encode(cursor)}}}'
+
+
+def create_http_session() -> 'requests.Session':
+	session = requests.Session()
+	adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE)
+	session.mount('https://', adapter)
+	session.mount('http://', adapter)
+	return session
+
+
+def create_logo_cache(directory: str) -> Cache.TieredCache:
+	return Cache.TieredCache(
+		Cache.LRUCache(LOGO_CACHE_MAX_ENTRIES, LOGO_CACHE_MAX_BYTES, LOGO_STALE_TTL),
+		Cache.DiskCache(FileSystem.Directory(directory), LOGO_STALE_TTL, LogoRecord.dumps, LogoRecord.loads)
+	)
+
+
+def http_session() -> 'requests.Session':
+	# Created on first use so processes that never fetch a logo never import requests
+	global HTTP_SESSION
+
+	if HTTP_SESSION is None:
+		HTTP_SESSION = create_http_session()
+
+	return HTTP_SESSION
+
+
+def retry_after(value: str | None) -> float | None:
+	# Retry-After is either delta seconds or an HTTP date
+	if value is None:
+		return None
+	elif value.strip().isdigit():
+		seconds = float(value)
+	else:
+		try:
+			seconds = email.utils.parsedate_to_datetime(value).timestamp() - time.time()
+		except (TypeError, ValueError):
+			return None
+
+	return min(max(seconds, 0), LOGO_RETRY_AFTER_MAX)
+
+
+def request_website_logo(url: str, limiter: Concurrent.Limiter, timeout: float = None) -> LogoRecord:
+	# Asks the logo service once, raising LogoUnavailableError with the reason when it could not be asked or gave no answer worth caching
+	if not LOGO_BREAKER.allow():
+		raise LogoUnavailableError('breaker', 'Logo service circuit breaker is open')
+	elif not limiter.acquire(timeout):
+		LOGO_BREAKER.cancel()
+		raise LogoUnavailableError('limit', 'No logo service slot within the limiter wait')
+
+	start = time.perf_counter()
+
+	try:
+		res = http_session().get(f'{LOGO_SERVICE_URL}{url}', timeout=HTTP_TIMEOUT)
+	except requests.RequestException as err:
+		LOGO_BREAKER.failure()
+		LOGO_UPSTREAM_LATENCY.observe(time.perf_counter() - start, ('error', ))
+		raise LogoUnavailableError('error', f'Logo service unreachable: {err}') from err
+	finally:
+		limiter.release()
+
+	LOGO_UPSTREAM_LATENCY.observe(time.perf_counter() - start, (str(res.status_code), ))
+
+	# Throttling is as transient as a server error, both count against the breaker
+	if res.status_code >= 500 or res.status_code == 429:
+		LOGO_BREAKER.failure(retry_after(res.headers.get('Retry-After')))
+		raise LogoUnavailableError('throttled' if res.status_code == 429 else 'server', f'Logo service answered {res.status_code}')
+
+	# Anything else is a definite answer, so a 4xx is cached too, if only for LOGO_NEGATIVE_TTL
+	LOGO_BREAKER.success()
+	logo = LogoRecord(res.content, res.headers.get('Content-Type', ''), time.time(), res.status_code)
+	LOGO_CACHE.set(url, logo)
+	return logo
+
+
+def fetch_website_logo(url: str) -> LogoRecord:
+	logo = LOGO_CACHE.get(url)
+
+	if logo is not None and logo.fresh():
+		return logo
+
+	try:
+		# With a stale copy to fall back on there is no point queueing for a slot
+		return request_website_logo(url, LOGO_LIMITER, None if logo is None else 0)
+	except LogoUnavailableError as err:
+		# Every failure is answered alike on every route, with the stale copy or the placeholder
+		if err.reason in ('breaker', 'limit'):
+			LOGO_UPSTREAM_REJECTIONS.inc(1, (err.reason, 'fallback' if logo is None else 'stale'))
+
+		return LOGO_FALLBACK if logo is None else logo
+
+
+def get_website_logo(url: str) -> LogoRecord:
+	logo = LOGO_CACHE.get(url)
+
+	if logo is None:
+		LOGO_CACHE_LOOKUPS.inc(1, ('miss', ))
+		return LOGO_FLIGHTS.run(url, fetch_website_logo, url)
+	elif logo.fresh():
+		LOGO_CACHE_LOOKUPS.inc(1, ('hit', ))
+	else:
+		# Stale while revalidate: answer now, refresh off the request path
+		LOGO_CACHE_LOOKUPS.inc(1, ('stale', ))
+
+		if url not in LOGO_FLIGHTS:
+			LOGO_REFRESHES.inc()
+			Concurrent.ThreadedFunction(LOGO_FLIGHTS.run, True)(url, fetch_website_logo, url)
+
+	return logo
+
+
+def build_logo_sprite(snapshot: DisciplinesSnapshot, discipline: str) -> tuple[PreparedResponse, PreparedResponse, tuple[str, ...], float]:
+	companies = snapshot.disciplines[discipline]['companies']
+	names = list(companies)
+	cells = {}
+	images = []
+	missing = []
+	built = time.time()
+
+	with concurrent.futures.ThreadPoolExecutor(SPRITE_WORKERS, 'logo_sprite') as executor:
+		futures = [executor.submit(get_website_logo, companies[name]['url']) for name in names]
+
+	for name, future in zip(names, futures):
+		logo = future.result()
+
+		# Companies left out of the map fall back to /logo on the client
+		if logo is LOGO_FALLBACK:
+			missing.append(companies[name]['url'])
+			continue
+		elif logo.status >= 400 or not logo.content_type.startswith('image/'):
+			continue
+
+		column, row = len(cells) % SPRITE_COLUMNS, len(cells) // SPRITE_COLUMNS
+		cells[name] = [column, row]
+		images.append(f'<image x="{column * SPRITE_CELL}" y="{row * SPRITE_CELL}" width="{SPRITE_CELL}" height="{SPRITE_CELL}" href="data:{logo.content_type.split(";")[0]};base64,{logo.encoded.decode()}"/>')
+
+	columns = max(1, min(len(cells), SPRITE_COLUMNS))
+	rows = max(1, -(-len(cells) // SPRITE_COLUMNS))
+	width, height = columns * SPRITE_CELL, rows * SPRITE_CELL
+	sheet = PreparedResponse(f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" viewBox="0 0 {width} {height}">{"".join(images)}</svg>'.encode(), 'image/svg+xml', 'public, max-age=31536000, immutable')
+	# The sheet hash is part of the url since a rebuild within one data version produces a different immutable sheet
+	mapping = {'sprite': f'/sprites/{urllib.parse.quote(discipline, safe="")}/{snapshot.version}/{sheet.etag[:12]}.svg', 'columns': columns, 'rows': rows, 'companies': cells}
+	return PreparedResponse(json.encoder.JSONEncoder().encode(mapping).encode()), sheet, tuple(missing), built
+
+
+def prefetch_logos(disciplines: dict, workers: int = WARMUP_WORKERS, deadline: float = WARMUP_DEADLINE, limiter: Concurrent.Limiter = None) -> dict[str, float | Exception]:
+	# Warmup runs before traffic is accepted, so it has its own upstream budget and waits up to the deadline for it instead of LOGO_UPSTREAM_WAIT
+	limiter = Concurrent.Limiter(-1, Concurrent.TokenBucket(LOGO_UPSTREAM_RATE, LOGO_UPSTREAM_BURST), deadline) if limiter is None else limiter
+
+	def prefetch(url: str) -> float:
+		start = time.perf_counter()
+		logo = LOGO_CACHE.get(url)
+
+		if logo is None or not logo.fresh():
+			logo = request_website_logo(url, limiter)
+
+		if logo.status >= 400:
+			raise LookupError(f'Logo service has no logo ({logo.status})')
 
+		return time.perf_counter() - start
 
-def get_website_logo(url: str) -> bytes:
-	res = requests.get(f'https://logo.clearbit.com/{url}')
-	return base64.b64encode(res.content)
+	urls = {company['url'] for discipline in disciplines.values() for company in discipline['companies'].values()}
+	executor = concurrent.futures.ThreadPoolExecutor(max(1, workers), 'logo_warmup')
+	futures = {executor.submit(prefetch, url): url for url in urls}
+	done, pending = concurrent.futures.wait(futures, timeout=deadline)
+	executor.shutdown(wait=False, cancel_futures=True)
+	results = {}
+
+	for future in done:
+		url = futures[future]
+		results[url] = future.exception() or future.result()
+
+		if isinstance(results[url], Exception):
+			print(f'\033[38;2;255;0;0m  [FAIL] {url}: {results[url]}\033[0m')
+		else:
+			print(f'\033[38;2;0;255;0m  [ OK ] {url} ({results[url] * 1000:.1f}ms)\033[0m')
+
+	for future in pending:
+		url = futures[future]
+		results[url] = TimeoutError(f'Not fetched within {deadline}s')
+		print(f'\033[38;2;255;255;0m  [SKIP] {url}: {results[url]}\033[0m')
+
+	return results
+
+
+def serve_worker(listener: socket.socket, channel: socket.socket, watcher: DisciplinesWatcher | None, publisher: bool = True):
+	global HTTP_SESSION, PUBLISHER
+	HTTP_SESSION = None
+	PUBLISHER = publisher
+	server = werkzeug.serving.make_server(*listener.getsockname()[:2], app, threaded=True, fd=listener.fileno())
+
+	if watcher is not None:
+		watcher.start()
+
+	while True:
+		message, fds, flags, address = socket.recv_fds(channel, 1024, 1)
+
+		if len(fds) == 0:
+			break
+
+		server.process_request(socket.socket(fileno=fds[0]), tuple(json.loads(message)))
+
+
+def prefork(host: str, port: int, workers: int, watcher: DisciplinesWatcher | None = None, shared_emits: bool = False):
+	listener = socket.create_server((host, port), backlog=PREFORK_BACKLOG)
+	channels = [None] * workers  # type: list[socket.socket | None]
+
+	def spawn(index: int):
+		parent, child = socket.socketpair()
+		pid = os.fork()
+
+		if pid == 0:
+			signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+			parent.close()
+
+			for channel in channels:
+				channel is None or channel.close()
+
+			try:
+				serve_worker(listener, child, watcher, index == 0 or not shared_emits)
+			finally:
+				os._exit(0)
+
+		child.close()
+		channels[index] = parent
+		print(f'\033[38;2;0;255;0m  Worker {index} started [PID {pid}]\033[0m')
+
+	def reap(sig, frame):
+		# Dead workers are respawned when their channel next fails; collect them here so they do not linger as zombies
+		try:
+			while os.waitpid(-1, os.WNOHANG)[0] != 0:
+				pass
+		except ChildProcessError:
+			pass
+
+	# Everything loaded so far is shared copy-on-write; keep the GC from touching it in the workers
+	gc.collect()
+	gc.freeze()
+	signal.signal(signal.SIGCHLD, reap)
+
+	for i in range(workers):
+		spawn(i)
+
+	while True:
+		conn, address = listener.accept()
+		index = zlib.crc32(address[0].encode()) % workers  # Sticky by client address for Socket.IO polling
+
+		for attempt in range(2):
+			try:
+				socket.send_fds(channels[index], [json.dumps(address[:2]).encode()], [conn.fileno()])
+				break
+			except OSError:
+				channels[index].close()
+				spawn(index)
+
+		conn.close()
 
 
 signal.signal(signal.SIGINT, onkill)
 
+HTTP_SESSION = None  # type: requests.Session | None
+LOGO_CACHE = create_logo_cache('data/logo_cache')
+LOGO_FALLBACK = LogoRecord(LOGO_FALLBACK_SVG, 'image/svg+xml', 0, cache_control='no-store')
+
 app = Flask(__name__, static_folder='main/static', template_folder='main/templates')
+STATIC_ASSETS = assets.build(app.static_folder)
+STATIC_FILES = {asset.hashed: PreparedResponse(asset.body, asset.mimetype, f'public, max-age={STATIC_MAX_AGE}, immutable') for asset in STATIC_ASSETS.values()}
+
+
+@app.url_defaults
+def fingerprint_static(endpoint: str, values: dict):
+	if endpoint == 'static' and values.get('filename') in STATIC_ASSETS:
+		values['filename'] = STATIC_ASSETS[values['filename']].hashed
+
+
+def serve_static(filename: str):
+	# Fingerprinted names come from memory, anything else still goes to disk
+	prepared = STATIC_FILES.get(filename)
+	return app.send_static_file(filename) if prepared is None else prepared.respond()
+
+
+app.view_functions['static'] = serve_static
+
+
+@app.before_request
+def metrics_before_request():
+	g.metrics_start = time.perf_counter()
+	REQUESTS_IN_FLIGHT.inc(1, (request.endpoint or 'unmatched', ))
+
+
+@app.after_request
+def metrics_after_request(response: Response) -> Response:
+	route = request.endpoint or 'unmatched'
+	REQUEST_LATENCY.observe(time.perf_counter() - g.metrics_start, (route, request.method, str(response.status_code)))
+
+	if not response.is_streamed:
+		REQUEST_SIZE.observe(response.calculate_content_length() or 0, (route, ))
+
+	return response
+
+
+@app.teardown_request
+def metrics_teardown_request(error: BaseException | None):
+	REQUESTS_IN_FLIGHT.dec(1, (request.endpoint or 'unmatched', ))
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+	return Response(METRICS.render(), status=200, content_type='text/plain; version=0.0.4; charset=utf-8')
 
 
 @app.route('/', methods=['GET'])
@@ -44,23 +767,78 @@ def questionnaire():
 	return render_template('questionnaire.html')
 
 
-@app.route('/get_disciplines', methods=['POST'])
+@app.route('/get_disciplines', methods=['GET', 'POST'])
 def get_disciplines():
-	return Response(json.encoder.JSONEncoder().encode({'keys': list(DISCIPLINES.keys()), 'names': [' '.join(d.capitalize() for d in x.split('_')) for x in DISCIPLINES.keys()]}), 200)
+	return SNAPSHOT.response.respond()
 
 
 @app.route('/get_select_disciplines', methods=['POST'])
 def get_select_disciplines():
-	targets = json.decoder.JSONDecoder().decode(request.data.decode())['targets']
-	output = {}
+	data = json.decoder.JSONDecoder().decode(request.data.decode())
+	snapshot = SNAPSHOT
+	legacy = int(bool(data.get('legacy', False)))
+	output = []
 
-	for target in targets:
-		if target in DISCIPLINES:
-			output[target] = json.encoder.JSONEncoder().encode(DISCIPLINES[target])
+	for target in dict.fromkeys(data['targets']):
+		if target in snapshot.disciplines:
+			output.append(snapshot.fragments[target][legacy])
 		else:
 			return Response('Target discipline not found', status=404)
 
-	return Response(json.encoder.JSONEncoder().encode(output), status=200)
+	# Lets the client tell whether these fragments match the ones it already holds
+	return Response(b'{' + b', '.join(output) + b'}', status=200, mimetype='application/json', headers={'X-Data-Version': snapshot.version})
+
+
+@app.route('/search/suggest', methods=['GET'])
+def search_suggest():
+	count = min(request.args.get('k', 10, type=int), SUGGEST_LIMIT)
+	suggestions = SNAPSHOT.suggestions.search(request.args.get('q', ''), count)
+	return Response(json.encoder.JSONEncoder().encode(suggestions), status=200, mimetype='application/json')
+
+
+@app.route('/search/questions', methods=['GET'])
+def search_questions():
+	snapshot = SNAPSHOT
+	page = max(request.args.get('page', 1, type=int), 1)
+	per_page = min(max(request.args.get('per_page', 10, type=int), 1), QUESTIONS_PAGE_LIMIT)
+	total, hits = snapshot.questions.search(request.args.get('q', ''), (page - 1) * per_page, per_page)
+	output = {'total': total, 'page': page, 'per_page': per_page, 'hits': []}
+
+	for score, (discipline, company, index) in hits:
+		question = snapshot.company(discipline, company)['questions'][index]
+		output['hits'].append({'discipline': discipline, 'company': company, 'index': index, 'question': question, 'score': round(score, 4)})
+
+	return Response(json.encoder.JSONEncoder().encode(output), status=200, mimetype='application/json')
+
+
+@app.route('/disciplines/<discipline>/<company>/<kind>', methods=['GET'])
+def get_company_items(discipline: str, company: str, kind: str):
+	snapshot = SNAPSHOT
+	limit = min(max(request.args.get('limit', 10, type=int), 1), ITEMS_PAGE_LIMIT)
+	data = snapshot.company(discipline, company)
+
+	if kind not in ('questions', 'jobs'):
+		return Response('Target collection not found', status=404)
+	elif discipline not in snapshot.disciplines:
+		return Response('Target discipline not found', status=404)
+	elif data is None:
+		return Response('Target company not found', status=404)
+	elif 'cursor' in request.args:
+		try:
+			version, start = decode_cursor(request.args['cursor'])
+		except ValueError:
+			return Response('Malformed cursor', status=400)
+
+		if version != snapshot.version:
+			return Response('Cursor expired', status=410)
+	else:
+		start = 0
+
+	items = data[kind]
+	start = min(max(start, 0), len(items))
+	end = min(start + limit, len(items))
+	cursor = encode_cursor(snapshot.version, end) if end < len(items) else None
+	return Response(stream_items(items, start, end, cursor), status=200, mimetype='application/json')
 
 
 @app.route('/get_web_logo', methods=['POST'])
@@ -68,24 +846,127 @@ def get_web_logo():
 	data = json.decoder.JSONDecoder().decode(request.data.decode())
 	discipline = data['discipline']
 	company = data['company']
+	snapshot = SNAPSHOT
+	url = snapshot.company_url(discipline, company)
 
-	if discipline not in DISCIPLINES:
+	if discipline not in snapshot.disciplines:
 		return Response('Target discipline not found', status=404)
-	elif company not in DISCIPLINES[discipline]['companies']:
+	elif url is None:
 		return Response('Target company not found', status=404)
-	else:
-		return get_website_logo(DISCIPLINES[discipline]['companies'][company]['url'])
+
+	logo = get_website_logo(url)
+	return logo.encoded if logo.status < 400 else logo.respond()
+
+
+@app.route('/sprites/<discipline>', methods=['GET'])
+def get_sprite_map(discipline: str):
+	snapshot = SNAPSHOT
+
+	if discipline not in snapshot.disciplines:
+		return Response('Target discipline not found', status=404)
+
+	return snapshot.sprites[discipline][0].respond()
+
+
+@app.route('/sprites/<discipline>/<version>/<digest>.svg', methods=['GET'])
+def get_sprite(discipline: str, version: str, digest: str):
+	snapshot = SNAPSHOT
+
+	if discipline not in snapshot.disciplines:
+		return Response('Target discipline not found', status=404)
+	elif version != snapshot.version:
+		return Response('Sprite version expired', status=410)
+
+	sheet = snapshot.sprites[discipline][1]
+	return sheet.respond() if sheet.etag.startswith(digest) and len(digest) == 12 else Response('Sprite sheet rebuilt', status=410)
+
+
+@app.route('/logo/<discipline>/<company>', methods=['GET'])
+def get_logo(discipline: str, company: str):
+	snapshot = SNAPSHOT
+	url = snapshot.company_url(discipline, company)
+
+	if discipline not in snapshot.disciplines:
+		return Response('Target discipline not found', status=404)
+	elif url is None:
+		return Response('Target company not found', status=404)
+
+	return get_website_logo(url).respond()
 
 
 if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--warmup', action='store_true', help='Prefetch every company logo before accepting traffic')
+	parser.add_argument('--warmup-workers', type=int, default=WARMUP_WORKERS, help='Concurrent logo fetches during warmup')
+	parser.add_argument('--warmup-deadline', type=float, default=WARMUP_DEADLINE, help='Seconds warmup may delay startup')
+	parser.add_argument('--reload-interval', type=float, default=RELOAD_INTERVAL, help='Seconds between checks for data file changes (0 disables)')
+	parser.add_argument('--workers', type=int, default=0, help='Prefork this many worker processes (0 serves from this process)')
+	parser.add_argument('--message-queue', default=None, help='Socket.IO message queue URL so emits reach clients of every worker')
+	parser.add_argument('--database', default=None, help='Serve from this SQLite database, imported from disciplines.json when missing or older')
+	parser.add_argument('--logo-rate', type=float, default=LOGO_UPSTREAM_RATE, help='Logo service requests per second (negative disables the limit)')
+	parser.add_argument('--logo-burst', type=float, default=LOGO_UPSTREAM_BURST, help='Logo service requests allowed in a burst')
+	parser.add_argument('--logo-concurrency', type=int, default=LOGO_UPSTREAM_CONCURRENCY, help='Logo service requests in flight at once (negative disables the limit)')
+	parser.add_argument('--logo-breaker-failures', type=int, default=LOGO_BREAKER_FAILURES, help='Consecutive logo service failures that open the circuit breaker')
+	parser.add_argument('--logo-breaker-reset', type=float, default=LOGO_BREAKER_RESET, help='Seconds the circuit breaker stays open before probing the logo service again')
+	parser.add_argument('--profile-startup', action='store_true', help='Report what importing main.py costs per module, then exit')
+	parser.add_argument('--packed', action='store_true', help='Serve from a memory mapped disciplines.bin, compiled from disciplines.json when missing or older')
+	ARGS = parser.parse_args()
+
+	if ARGS.profile_startup:
+		PROFILE_TIME, PROFILE = Imports.profile('import main', os.getcwd())
+		print(f'\n\033[38;2;0;255;255mImporting main took {PROFILE_TIME * 1000:.1f}ms including interpreter start ({len(PROFILE)} modules)\033[0m')
+		print(f'\n{"direct import":<40}{"self ms":>12}{"total ms":>12}')
+
+		for NAME, DEPTH, OWN, TOTAL in sorted(Imports.children(PROFILE, 'main'), key=lambda x: -x[3]):
+			print(f'{NAME:<40}{OWN * 1000:>12.1f}{TOTAL * 1000:>12.1f}')
+
+		print(f'\n{"slowest module":<40}{"self ms":>12}{"total ms":>12}')
+
+		for NAME, DEPTH, OWN, TOTAL in sorted(PROFILE, key=lambda x: -x[2])[:PROFILE_TOP]:
+			print(f'{NAME:<40}{OWN * 1000:>12.1f}{TOTAL * 1000:>12.1f}')
+
+		sys.exit(0)
+
 	# [ Start Server ] #
+	LOGO_LIMITER = Concurrent.Limiter(ARGS.logo_concurrency, Concurrent.TokenBucket(ARGS.logo_rate, ARGS.logo_burst), LOGO_UPSTREAM_WAIT)
+	LOGO_BREAKER = Concurrent.CircuitBreaker(ARGS.logo_breaker_failures, ARGS.logo_breaker_reset)
 	JSON_FILE = FileSystem.File("data/disciplines.json")
+	DATABASE_FILE = None if ARGS.database is None else FileSystem.File(ARGS.database)
 
-	if not JSON_FILE.exists():
-		print('\n\033[38;2;255;0;0mMissing JSON file, server start INTERRUPT\033[0m')
+	if DATABASE_FILE is not None and JSON_FILE.exists() and (not DATABASE_FILE.exists() or DATABASE_FILE.modified() < JSON_FILE.modified()):
+		print(f'\n\033[38;2;0;255;255mImported {JSON_FILE.basename()} into {DATABASE_FILE.basename()} [{store.import_json(JSON_FILE.filepath(), DATABASE_FILE.filepath())}]\033[0m')
+
+	if DATABASE_FILE is not None:
+		SOURCE_FILE, SOURCE_LOADER = DATABASE_FILE, read_database_snapshot
+	elif ARGS.packed:
+		SOURCE_FILE, SOURCE_LOADER = JSON_FILE, read_packed_snapshot
+	else:
+		SOURCE_FILE, SOURCE_LOADER = JSON_FILE, read_snapshot
+
+	if not SOURCE_FILE.exists():
+		print(f'\n\033[38;2;255;0;0mMissing {SOURCE_FILE.basename()}, server start INTERRUPT\033[0m')
 	else:
-		DISCIPLINES = open_read_json_file(JSON_FILE)
-		SOCKETIO = Connection.FlaskSocketioServer(app)
-		print('\n\033[38;2;0;255;0mServer Started [0.0.0.0:8080]\033[0m')
-		SOCKETIO.listen('0.0.0.0', 8080)
+		swap_snapshot(SOURCE_LOADER(SOURCE_FILE))
+
+		if ARGS.warmup:
+			print('\n\033[38;2;0;255;255mPrefetching Logos...\033[0m')
+			WARMUP_START = time.perf_counter()
+			WARMUP_LIMITER = Concurrent.Limiter(-1, Concurrent.TokenBucket(ARGS.logo_rate, ARGS.logo_burst), ARGS.warmup_deadline)
+			WARMUP = prefetch_logos(SNAPSHOT.disciplines, ARGS.warmup_workers, ARGS.warmup_deadline, WARMUP_LIMITER)
+			WARMUP_FAILED = sum(isinstance(x, Exception) for x in WARMUP.values())
+			print(f'\033[38;2;0;255;255mPrefetched {len(WARMUP) - WARMUP_FAILED}/{len(WARMUP)} logos in {time.perf_counter() - WARMUP_START:.2f}s\033[0m')
+
+		WATCHER = DisciplinesWatcher(SOURCE_FILE, SOURCE_LOADER, ARGS.reload_interval) if ARGS.reload_interval > 0 else None
+		SOCKETIO = Connection.FlaskSocketioServer(app, message_queue=ARGS.message_queue)
+		UPDATES = SOCKETIO.of('/updates')
+		UPDATES.on('connect', lambda socket: socket.emit('version', SNAPSHOT.version))
+
+		if ARGS.workers > 0:
+			SOCKETIO.prepare()
+			print(f'\n\033[38;2;0;255;0mServer Started [{SERVER_HOST}:{SERVER_PORT}] with {ARGS.workers} workers\033[0m')
+			prefork(SERVER_HOST, SERVER_PORT, ARGS.workers, WATCHER, ARGS.message_queue is not None)
+		else:
+			WATCHER is None or WATCHER.start()
+			print(f'\n\033[38;2;0;255;0mServer Started [{SERVER_HOST}:{SERVER_PORT}]\033[0m')
+			SOCKETIO.listen(SERVER_HOST, SERVER_PORT)
 
@@ -1,4 +1,56 @@
 const HOVER_FADE_TIME = 100;
+const DISCIPLINE_CACHE = {};
+let DATA_VERSION = null;
+
+function clear_discipline_cache()
+{
+    for (let key of Object.keys(DISCIPLINE_CACHE)) delete DISCIPLINE_CACHE[key];
+}
+
+function select_cached_disciplines(keys)
+{
+    let output = {};
+    for (let key of keys) if (key in DISCIPLINE_CACHE) output[key] = DISCIPLINE_CACHE[key];
+    return output;
+}
+
+function apply_patch(target, ops)
+{
+    for (let op of ops)
+    {
+        let node = target;
+        let last = op.path.length - 1;
+
+        for (let index = 0; index < last && node !== undefined; index++) node = node[op.path[index]];
+
+        // Patches below a discipline this page never loaded are ignored
+        if (node === undefined || (last === 0 && op.op === 'set' && !(op.path[0] in target))) continue;
+        else if (op.op === 'remove') delete node[op.path[last]];
+        else node[op.path[last]] = op.value;
+    }
+}
+
+function updates_init()
+{
+    if (typeof io === 'undefined') return;
+
+    let socket = io('/updates');
+
+    socket.on('version', function(version){
+        // A different version after (re)connecting means patches were missed, so start over
+        if (DATA_VERSION !== null && version !== DATA_VERSION) clear_discipline_cache();
+        DATA_VERSION = version;
+    });
+
+    socket.on('patch', function(patch){
+        // Already at this version, e.g. a duplicate delivered through a shared message queue
+        if (patch.to === DATA_VERSION) return;
+        else if (patch.from === DATA_VERSION) apply_patch(DISCIPLINE_CACHE, patch.ops);
+        else clear_discipline_cache();
+
+        DATA_VERSION = patch.to;
+    });
+}
 
 function branch_option_exit(max_index)
 {
@@ -104,6 +156,66 @@ function on_search_input_change(element)
     }
 }
 
+function load_logo_sprite(branch, callback)
+{
+    let xml = new XMLHttpRequest();
+
+    xml.onreadystatechange = function()
+    {
+        if (xml.readyState === XMLHttpRequest.DONE)
+        {
+            if (xml.status === 200)
+            {
+                let sprite = JSON.parse(xml.response);
+                let image = new Image();
+                image.onload = function() { callback(sprite); };
+                image.onerror = function() { callback(null); };
+                image.src = sprite.sprite;
+            }
+            else
+            {
+                callback(null);
+            }
+        }
+    }
+
+    xml.open('GET', `/sprites/${encodeURIComponent(branch)}`);
+    xml.send();
+}
+
+function company_option_node(branch, company, cid, sprite)
+{
+    let node = document.createElement('div');
+    let text = document.createElement('span');
+    let cell = (sprite === null) ? undefined : sprite.companies[company];
+    let logo;
+
+    if (cell === undefined)
+    {
+        // Plain GET so the browser cache answers repeat visits
+        logo = document.createElement('img');
+        logo.src = `/logo/${encodeURIComponent(branch)}/${encodeURIComponent(company)}`;
+    }
+    else
+    {
+        logo = document.createElement('div');
+        logo.className = 'sprite_logo';
+        logo.style.backgroundImage = `url("${sprite.sprite}")`;
+        logo.style.backgroundSize = `${sprite.columns * 100}% ${sprite.rows * 100}%`;
+        logo.style.backgroundPosition = `${(sprite.columns > 1) ? cell[0] / (sprite.columns - 1) * 100 : 0}% ${(sprite.rows > 1) ? cell[1] / (sprite.rows - 1) * 100 : 0}%`;
+    }
+
+    text.innerHTML = capitalize(company);
+    node.append(logo);
+    node.appendChild(text);
+    node.appendChild(document.createElement('hr'));
+    node.className = 'company_option';
+    node.style.left = '100%';
+    node.id = `company_option_${cid}`;
+    node.dataset.company = company;
+    return node;
+}
+
 function search(selected, max_index)
 {
     let values = [];
@@ -127,49 +239,15 @@ function search(selected, max_index)
 
                 for (let branch of Object.keys(res))
                 {
-                    let json = JSON.parse(res[branch]);
+                    let json = res[branch];
                     let keys = Object.keys(json.companies);
                     highest_index += keys.length;
 
-                    for (let cid in keys)
-                    {
-                        let company = keys[cid];
-                        let xml = new XMLHttpRequest();
-                        companies[company] = json.companies[company];
+                    for (let company of keys) companies[company] = json.companies[company];
 
-                        xml.onreadystatechange = function()
-                        {
-                            if (xml.readyState === XMLHttpRequest.DONE)
-                            {
-                                if (xml.status === 200)
-                                {
-                                    console.log('Got');
-                                    let node = document.createElement('div');
-                                    let logo = document.createElement('img');
-                                    let text = document.createElement('span');
-
-                                    logo.src = "data:image/png;base64," + xml.response;
-                                    text.innerHTML = capitalize(company);
-                                    node.append(logo);
-                                    node.appendChild(text);
-                                    node.appendChild(document.createElement('hr'));
-                                    node.className = 'company_option';
-                                    node.style.left = '100%';
-                                    node.id = `company_option_${cid}`;
-                                    node.dataset.company = company;
-                                    elements.push(node);
-                                }
-                                else
-                                {
-                                    alert('Request Failed');
-                                }
-                            }
-                        }
-
-                        xml.open('POST', '/get_web_logo');
-                        xml.setRequestHeader('Content-Type', 'text/plain');
-                        xml.send(JSON.stringify({'discipline': branch, 'company': company}));
-                    }
+                    load_logo_sprite(branch, function(sprite){
+                        for (let cid in keys) elements.push(company_option_node(branch, keys[cid], cid, sprite));
+                    });
                 }
 
                 let left_anim_timer = window.setInterval(function(){
@@ -192,6 +270,22 @@ function search(selected, max_index)
             }
         }, 10);
     });
+
+    fetch_disciplines(values, 3, function(output){
+        res = output;
+    });
+}
+
+function fetch_disciplines(values, attempts, done)
+{
+    let missing = values.filter(key => !(key in DISCIPLINE_CACHE));
+
+    if (missing.length === 0)
+    {
+        done(select_cached_disciplines(values));
+        return;
+    }
+
     let xml = new XMLHttpRequest();
 
     xml.onreadystatechange = function()
@@ -200,7 +294,16 @@ function search(selected, max_index)
         {
             if (xml.status === 200)
             {
-                res = JSON.parse(xml.response);
+                let version = xml.getResponseHeader('X-Data-Version');
+
+                // Built from another snapshot than the cached disciplines, so those are dropped and fetched again to match
+                if (DATA_VERSION !== null && version !== DATA_VERSION) clear_discipline_cache();
+
+                DATA_VERSION = version;
+                Object.assign(DISCIPLINE_CACHE, JSON.parse(xml.response));
+
+                if (attempts > 0) fetch_disciplines(values, attempts - 1, done);
+                else done(select_cached_disciplines(values));
             }
             else
             {
@@ -211,7 +314,7 @@ function search(selected, max_index)
 
     xml.open('POST', '/get_select_disciplines');
     xml.setRequestHeader('Content-Type', 'application/json');
-    xml.send(JSON.stringify({'targets': values}));
+    xml.send(JSON.stringify({'targets': missing}));
 }
 
 function companies_master(max_index, data)
@@ -252,6 +355,7 @@ function question_box_init()
 {
     const SELECTED_OPTIONS = [];
     let HIGHEST_OPTION_INDEX;
+    updates_init();
 
     window.setTimeout(function(){
         $('#question_box').animate({'top': '10vh', 'opacity': '1'}, 1000, function(){
@@ -348,7 +452,6 @@ function question_box_init()
 		}
 	}
 
-	xml.open('POST', '/get_disciplines');
-	xml.setRequestHeader('Content-Type', 'text/plain');
+	xml.open('GET', '/get_disciplines');
 	xml.send();
 }
\ No newline at end of file
@@ -0,0 +1,196 @@
+import os
+import sys
+import json
+import hashlib
+import sqlite3
+import weakref
+import threading
+import collections.abc
+
+sys.path.append('../Custom Methods VI')
+import Cache
+
+SCHEMA = '''
+CREATE TABLE metadata (key TEXT PRIMARY KEY, value TEXT NOT NULL) WITHOUT ROWID;
+CREATE TABLE disciplines (id INTEGER PRIMARY KEY, key TEXT NOT NULL UNIQUE, position INTEGER NOT NULL, extra TEXT NOT NULL);
+CREATE TABLE companies (id INTEGER PRIMARY KEY, discipline_id INTEGER NOT NULL REFERENCES disciplines (id), name TEXT NOT NULL, url TEXT NOT NULL, position INTEGER NOT NULL, extra TEXT NOT NULL, UNIQUE (discipline_id, name));
+CREATE TABLE questions (company_id INTEGER NOT NULL REFERENCES companies (id), position INTEGER NOT NULL, text TEXT NOT NULL, PRIMARY KEY (company_id, position)) WITHOUT ROWID;
+CREATE TABLE jobs (company_id INTEGER NOT NULL REFERENCES companies (id), position INTEGER NOT NULL, data TEXT NOT NULL, PRIMARY KEY (company_id, position)) WITHOUT ROWID;
+CREATE INDEX disciplines_position ON disciplines (position);
+CREATE INDEX companies_position ON companies (discipline_id, position);
+'''
+__STORES__ = weakref.WeakValueDictionary()  # type: weakref.WeakValueDictionary[int, SqliteDisciplines]  # Mappings are unhashable, so keyed by id
+
+
+def __after_fork__():
+	for store in tuple(__STORES__.values()):
+		store.__reopen__()
+
+
+if hasattr(os, 'register_at_fork'):
+	os.register_at_fork(after_in_child=__after_fork__)
+
+
+def import_json(source: str, target: str) -> str:
+	with open(source, 'rb') as f:
+		data = f.read()
+
+	disciplines = json.loads(data.decode())
+	version = hashlib.sha256(data).hexdigest()[:16]
+	temp = f'{target}.{os.getpid()}.tmp'
+
+	if os.path.isfile(temp):
+		os.remove(temp)
+
+	db = sqlite3.connect(temp)
+
+	try:
+		with db:
+			db.executescript(SCHEMA)
+			db.execute('INSERT INTO metadata VALUES (?, ?)', ('version', version))
+
+			for position, (key, discipline) in enumerate(disciplines.items()):
+				extra = json.dumps({k: None if k == 'companies' else v for k, v in discipline.items()})  # Placeholders keep the original key order
+				discipline_id = db.execute('INSERT INTO disciplines (key, position, extra) VALUES (?, ?, ?)', (key, position, extra)).lastrowid
+
+				for index, (name, company) in enumerate(discipline['companies'].items()):
+					extra = json.dumps({k: None if k in ('url', 'questions', 'jobs') else v for k, v in company.items()})
+					company_id = db.execute('INSERT INTO companies (discipline_id, name, url, position, extra) VALUES (?, ?, ?, ?, ?)', (discipline_id, name, company['url'], index, extra)).lastrowid
+					db.executemany('INSERT INTO questions VALUES (?, ?, ?)', ((company_id, i, q) for i, q in enumerate(company.get('questions', ()))))
+					db.executemany('INSERT INTO jobs VALUES (?, ?, ?)', ((company_id, i, json.dumps(j)) for i, j in enumerate(company.get('jobs', ()))))
+	finally:
+		db.close()
+
+	os.replace(temp, target)
+	return version
+
+
+class SqliteDisciplines(collections.abc.Mapping):
+	'''
+	[SqliteDisciplines]: Read-only mapping of discipline key to discipline data backed by an SQLite database\n
+	Attributes:\n
+	\t"version": Version recorded by import_json (str) [GET]
+	Methods:\n
+	\t"company_url": Indexed lookup of one company's url (returns str | None)
+	\t"company": Indexed lookup of one company's data (returns dict | None)
+	\t"company_names": Every (discipline key, company name) pair in source order (returns list[tuple[str, str]])
+	\t"questions": Every (discipline key, company name, position, question) row in source order (returns list[tuple[str, str, int, str]])
+	'''
+
+	def __init__(self, path: str, cache_size: int = 64):
+		self.__path = path
+		self.__fd = os.open(path, os.O_RDONLY)  # Identifies this version of the file, import_json replaces it rather than writing in place
+		self.__reopen__()
+		__STORES__[id(self)] = self
+		self.__disciplines = Cache.LRUCache(cache_size)
+		self.__companies = Cache.LRUCache(cache_size * 8)
+		self.__urls = Cache.LRUCache(cache_size * 64)
+		self.__keys = tuple(row[0] for row in self.__query('SELECT key FROM disciplines ORDER BY position'))
+		self.__key_set = frozenset(self.__keys)
+		self.__version = self.__query('SELECT value FROM metadata WHERE key = ?', ('version', ))[0][0]
+
+	def __del__(self):
+		if hasattr(self, '_SqliteDisciplines__fd'):
+			os.close(self.__fd)
+
+	def __reopen__(self):
+		# One connection per process; it keeps reading the version it opened even after import_json replaces the file
+		self.__lock = threading.Lock()
+
+		try:
+			current = os.stat(self.__path)
+		except OSError:
+			current = None
+
+		pinned = os.fstat(self.__fd)
+
+		if current is None or (current.st_dev, current.st_ino) != (pinned.st_dev, pinned.st_ino):
+			if hasattr(self, '_SqliteDisciplines__db'):
+				return  # Replaced before a fork; the inherited immutable connection holds no locks and is the only way back to this version
+
+			raise FileNotFoundError(f'{self.__path} was replaced while opening')
+		elif hasattr(self, '_SqliteDisciplines__db'):
+			self.__db.close()
+
+		self.__db = sqlite3.connect(f'file:{self.__path}?mode=ro&immutable=1', uri=True, check_same_thread=False)
+
+	def __query(self, sql: str, args: tuple = ()) -> list[tuple]:
+		with self.__lock:
+			return self.__db.execute(sql, args).fetchall()
+
+	def __company(self, company_id: int, url: str, extra: str) -> dict:
+		company = json.loads(extra)
+		company['url'] = url
+		company['questions'] = [row[0] for row in self.__query('SELECT text FROM questions WHERE company_id = ? ORDER BY position', (company_id, ))]
+		company['jobs'] = [json.loads(row[0]) for row in self.__query('SELECT data FROM jobs WHERE company_id = ? ORDER BY position', (company_id, ))]
+		return company
+
+	def __getitem__(self, key: str) -> dict:
+		discipline = self.__disciplines.get(key)
+
+		if discipline is None:
+			rows = self.__query('SELECT id, extra FROM disciplines WHERE key = ?', (key, ))
+
+			if len(rows) == 0:
+				raise KeyError(key)
+
+			discipline = json.loads(rows[0][1])
+			discipline['companies'] = {name: self.__company(company_id, url, extra) for company_id, name, url, extra in self.__query('SELECT id, name, url, extra FROM companies WHERE discipline_id = ? ORDER BY position', (rows[0][0], ))}
+			self.__disciplines.set(key, discipline)
+
+		return discipline
+
+	def __iter__(self):
+		return iter(self.__keys)
+
+	def __len__(self):
+		return len(self.__keys)
+
+	def __contains__(self, key) -> bool:
+		return key in self.__key_set
+
+	def company_url(self, discipline: str, company: str) -> str | None:
+		url = self.__urls.get((discipline, company))
+
+		if url is None:
+			rows = self.__query('SELECT c.url FROM companies c JOIN disciplines d ON d.id = c.discipline_id WHERE d.key = ? AND c.name = ?', (discipline, company))
+
+			if len(rows) == 0:
+				return None
+
+			url = rows[0][0]
+			self.__urls.set((discipline, company), url)
+
+		return url
+
+	def company(self, discipline: str, company: str) -> dict | None:
+		data = self.__companies.get((discipline, company))
+
+		if data is None:
+			rows = self.__query('SELECT c.id, c.url, c.extra FROM companies c JOIN disciplines d ON d.id = c.discipline_id WHERE d.key = ? AND c.name = ?', (discipline, company))
+
+			if len(rows) == 0:
+				return None
+
+			data = self.__company(*rows[0])
+			self.__companies.set((discipline, company), data)
+
+		return data
+
+	def company_names(self) -> list[tuple[str, str]]:
+		# Only the columns the suggestion index needs, without materializing any company
+		return self.__query('SELECT d.key, c.name FROM companies c JOIN disciplines d ON d.id = c.discipline_id ORDER BY d.position, c.position')
+
+	def questions(self) -> list[tuple[str, str, int, str]]:
+		return self.__query('SELECT d.key, c.name, q.position, q.text FROM questions q JOIN companies c ON c.id = q.company_id JOIN disciplines d ON d.id = c.discipline_id ORDER BY d.position, c.position, q.position')
+
+	@property
+	def version(self) -> str:
+		return self.__version
+
+
+if __name__ == '__main__':
+	if len(sys.argv) != 3:
+		print('Usage: store.py <disciplines.json> <disciplines.sqlite3>')
+	else:
+		print(f'\033[38;2;0;255;0mImported {sys.argv[1]} -> {sys.argv[2]} [{import_json(sys.argv[1], sys.argv[2])}]\033[0m')